@@ -0,0 +1,9 @@
+def version() -> str:
+    # the metadata lookup is deferred until the version is actually requested so that it does not slow down startup
+    try:
+        from importlib.metadata import version as package_version
+    except ImportError:
+        # importlib.metadata was added in Python 3.8
+        from pkg_resources import require
+        return require("cvedb")[0].version
+    return package_version("cvedb")
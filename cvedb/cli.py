@@ -1,39 +1,55 @@
 import argparse
 from datetime import datetime
-from dateutil.parser import isoparse, ParserError
-import pkg_resources
+import re
+import signal
 import sys
-from typing import List, Optional, Union
+import threading
+from typing import Dict, List, Optional, Union
 
 from .cpe import Logical
 from .db import CVEdb, DEFAULT_DB_PATH
-from .feed import Data
-from .printing import print_cves
-from .search import (
-    AfterModifiedDateQuery, AfterPublishedDateQuery, AndQuery, BeforeModifiedDateQuery, BeforePublishedDateQuery,
-    CPEQuery, Sort
-)
+from ._version import version
 
 
-def version() -> str:
-    return pkg_resources.require("cvedb")[0].version
+LOGICALS_BY_VALUE: Dict[str, Logical] = {logical.value: logical for logical in Logical}
+
+# maps each `--sort` choice to the name of its `cvedb.search.Sort` member
+SORT_NAMES_BY_ARG: Dict[str, str] = {
+    "cve": "CVE_ID",
+    "modified": "LAST_MODIFIED_DATE",
+    "published": "PUBLISHED_DATE",
+    "impact": "IMPACT",
+    "severity": "SEVERITY"
+}
+
+# str.isdigit() also accepts non-ASCII digits such as "²", which int() rejects, so match years with an ASCII regex
+_YEAR_MATCH = re.compile(r"\d{4}", re.ASCII).fullmatch
+
+_DATE_ERROR = "Invalid date {!r}. Dates must be either a four digit year or an ISO 8601 string. See " \
+              "https://dateutil.readthedocs.io/en/stable/parser.html for examples."
 
 
 def parse_date(date_str: str) -> datetime:
+    if _YEAR_MATCH(date_str):
+        # a bare year is the most common usage, so handle it without any ISO 8601 parsing
+        return datetime(int(date_str), 1, 1).astimezone()
+    if sys.version_info >= (3, 7):
+        # datetime.fromisoformat is implemented in C, so try it before falling back to dateutil's parser
+        try:
+            return datetime.fromisoformat(date_str).astimezone()
+        except ValueError:
+            pass
+    from dateutil.parser import isoparse
     try:
         return isoparse(date_str).astimezone()
-    except ParserError:
+    except ValueError:
+        # this also catches dateutil's ParserError, which is a subclass of ValueError
         pass
-    raise argparse.ArgumentTypeError(f"Invalid date {date_str!r}. Dates must be either a four digit year or an ISO "
-                                     "8601 string. See https://dateutil.readthedocs.io/en/stable/parser.html "
-                                     "for examples.")
+    raise argparse.ArgumentTypeError(_DATE_ERROR.format(date_str))
 
 
 def parse_cpe_arg(cpe_str: str) -> Union[Logical, str]:
-    for logical in Logical:
-        if logical.value == cpe_str:
-            return logical
-    return cpe_str
+    return LOGICALS_BY_VALUE.get(cpe_str, cpe_str)
 
 
 def main(argv: Optional[List[str]] = None) -> int:
@@ -47,7 +63,7 @@ def main(argv: Optional[List[str]] = None) -> int:
     parser.add_argument("--database", "-db", type=str, nargs="?", default=DEFAULT_DB_PATH,
                         help=f"alternative path to load/store the database (default is {DEFAULT_DB_PATH!s})")
     parser.add_argument("--sort", "-s", nargs="*", default=("cve",),
-                        choices=("cve", "modified", "published", "impact", "severity"),
+                        choices=tuple(SORT_NAMES_BY_ARG),
                         help="how to sort the results (default is by CVE ID only)")
     parser.add_argument("--descending", "-d", action="store_true",
                         help="reverse the ordering of results (default is ascending)")
@@ -84,6 +100,8 @@ def main(argv: Optional[List[str]] = None) -> int:
             print(version())
         return 0
     elif args.data_version:
+        from .printing import print_table
+
         with CVEdb.open(args.database) as db:
             rows = [["Feed", "Last Modified", "Last Checked", "# CVEs"]]
             for feed in db.feeds:
@@ -98,29 +116,17 @@ def main(argv: Optional[List[str]] = None) -> int:
                 else:
                     lc = lc.strftime("%Y-%m-%d")
                 rows.append([feed.name, lm, lc, str(len(feed.data()))])
-            num_cols = len(rows[0])
-            col_widths = [max(len(row[i]) for row in rows) for i in range(num_cols)]
-            total_width = sum(col_widths) + num_cols + 1
-            sys.stdout.write(f"+{'=' * (total_width - 2)}+\n")
-            header = f"Database: {args.database!s}"
-            if len(header) + 2 > total_width:
-                header = f"Database: {str(args.database)[:total_width - 15]}..."
-            else:
-                header = f"{' ' * ((total_width - len(header)) // 2)}{header}"
-                header = f"{header}{' ' * (total_width - len(header))}"
-            sys.stdout.write(f"|{header}|\n")
-            sys.stdout.write(f"+{'=' * (total_width - 2)}+\n")
-            for i, header in enumerate(rows[0]):
-                sys.stdout.write(f"|{header}{' ' * (col_widths[i] - len(header))}")
-            sys.stdout.write("|\n")
-            sys.stdout.write(f"+{'=' * (total_width - 2)}+\n")
-            for row in rows[1:]:
-                for i, col in enumerate(row):
-                    sys.stdout.write(f"|{col}{' ' * (col_widths[i] - len(col))}")
-                sys.stdout.write("|\n")
-            sys.stdout.write(f"+{'=' * (total_width - 2)}+\n")
+            print_table(rows, title=f"Database: {args.database!s}")
             return 0
 
+    # these are only needed when actually searching, so defer importing them until after the fast-exit paths above
+    from .feed import Data
+    from .printing import print_cves
+    from .search import (
+        AfterModifiedDateQuery, AfterPublishedDateQuery, AndQuery, BeforeModifiedDateQuery, BeforePublishedDateQuery,
+        CPEQuery, Sort
+    )
+
     query = []
     if args.after:
         query.append(AfterPublishedDateQuery(args.after))
@@ -133,12 +139,13 @@ def main(argv: Optional[List[str]] = None) -> int:
     if args.SEARCH_TERM:
         query.append(Data.make_query(*args.SEARCH_TERM))
 
-    if args.software_version != Logical.ANY or args.vendor != Logical.ANY:
-        cpe = CPEQuery(
-            vendor=args.vendor,
-            version=args.software_version
-        )
-        query.append(cpe)
+    # only pass the CPE fields that were actually constrained; the rest default to Logical.ANY
+    cpe_fields = {
+        name: value for name, value in (("vendor", args.vendor), ("version", args.software_version))
+        if value != Logical.ANY
+    }
+    if cpe_fields:
+        query.append(CPEQuery(**cpe_fields))
     if len(query) == 1:
         query = query[0]
     elif query:
@@ -146,31 +153,30 @@ def main(argv: Optional[List[str]] = None) -> int:
     else:
         query = None
 
+    # check the terminal once up front rather than leaving it to the printing code
+    color = args.ansi or (sys.stdout.isatty() and sys.stderr.isatty())
+
+    previous_sigpipe_handler = None
+    if hasattr(signal, "SIGPIPE") and threading.current_thread() is threading.main_thread():
+        # Terminate as soon as whatever is reading our output goes away (e.g., when piped to `head`) rather than
+        # continuing to query and render results until the next write raises a BrokenPipeError. Signal handlers can
+        # only be installed from the main thread, and the previous one is restored afterward in case `main` was called
+        # from another program.
+        previous_sigpipe_handler = signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+
     try:
         with CVEdb.open(args.database) as db:
             if query is None:
                 # just print all of the CVEs
-                print_cves(db.data())
+                print_cves(db.data(), force_color=color)
             else:
-                sorts = []
-                for sort in args.sort:
-                    if sort == "cve":
-                        sorts.append(Sort.CVE_ID)
-                    elif sort == "modified":
-                        sorts.append(Sort.LAST_MODIFIED_DATE)
-                    elif sort == "published":
-                        sorts.append(Sort.PUBLISHED_DATE)
-                    elif sort == "impact":
-                        sorts.append(Sort.IMPACT)
-                    elif sort == "severity":
-                        sorts.append(Sort.SEVERITY)
-                if args.ansi:
-                    force_ansi = True
-                else:
-                    force_ansi = None
+                sorts = [Sort[SORT_NAMES_BY_ARG[sort]] for sort in args.sort]
                 print_cves(
                     db.data().search(query, sort=sorts, ascending=not args.descending),
-                    force_color=force_ansi
+                    force_color=color
                 )
     except (KeyboardInterrupt, BrokenPipeError):
         return 1
+    finally:
+        if previous_sigpipe_handler is not None:
+            signal.signal(signal.SIGPIPE, previous_sigpipe_handler)
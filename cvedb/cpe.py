@@ -1,17 +1,31 @@
 from abc import ABC, ABCMeta, abstractmethod
 from dataclasses import dataclass, fields
 from enum import Enum
+from functools import lru_cache
 from io import StringIO
 import re
-from typing import Callable, Dict, Iterable, Iterator, Optional, TextIO, Tuple, Type, TypeVar, Union
+from sys import intern
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Type, TypeVar, Union
 
 
+_AV_UNQUOTED_CHAR = r"[A-Za-z0-9\-._]"
+_AV_QUOTED_CHAR = r"\\[\\?*!\"#$%&'()+,/:;<=>@\[\]^`{|}~]"
+
 AV_STRING_REGEX = re.compile(
-    r"^(((\?+|\*)?([A-Za-z0-9\-._]|(\\[\\?*!\"#$%&'()+,/:;<=>@\[\]^`{|}~]))+(\?+|\*)?)|[*-]).*"
+    rf"^(((\?+|\*)?({_AV_UNQUOTED_CHAR}|({_AV_QUOTED_CHAR}))+(\?+|\*)?)|[*-]).*"
 )
 
 LANGTAG_REGEX = re.compile(r"^(([A-Za-z]{2,3})(-([A-Za-z]{2}|[0-9]{3}))?).*")
 
+# The patterns actually used by the parser accept the same strings as the public regexes above, but they omit the
+# trailing `.*` (which would otherwise scan to the end of the formatted string on every match) and only capture the
+# groups the parser needs, which saves the regex engine from tracking the others
+_AV_STRING_PATTERN = re.compile(rf"(?:(?:\?+|\*)?(?:{_AV_UNQUOTED_CHAR}|{_AV_QUOTED_CHAR})+(?:\?+|\*)?|[*-])")
+_LANGTAG_PATTERN = re.compile(r"([A-Za-z]{2,3})(?:-([A-Za-z]{2}|[0-9]{3}))?")
+
+_AV_STRING_MATCH = _AV_STRING_PATTERN.match
+_LANGTAG_MATCH = _LANGTAG_PATTERN.match
+
 
 TESTABLES_BY_UID: Dict[str, Type["Testable"]] = {}
 
@@ -36,7 +50,19 @@ class TestableMeta(ABCMeta):
 T = TypeVar("T", bound="Testable")
 
 
+class _StringBuilder(list):
+    """
+    A minimal stand-in for a writable text stream that just accumulates the written strings.
+
+    Joining the pieces once at the end is cheaper than writing each of them to a `StringIO`.
+
+    """
+    write = list.append
+
+
 class Testable(metaclass=TestableMeta):
+    __slots__ = ()
+
     uid: str
 
     @abstractmethod
@@ -52,9 +78,9 @@ class Testable(metaclass=TestableMeta):
         self.dump_content(stream)
 
     def dumps(self) -> str:
-        ret = StringIO()
-        self.dump(ret)
-        return ret.getvalue()
+        builder = _StringBuilder()
+        self.dump(builder)  # type: ignore
+        return "".join(builder)
 
     @staticmethod
     def load(stream: TextIO) -> "Testable":
@@ -91,55 +117,73 @@ class Logical(Enum):
         return self.value
 
 
+# module-level aliases of the Logical members so the parsing and matching inner loops do not look them up on the enum
+_ANY: Logical = Logical.ANY
+_NA: Logical = Logical.NA
+
+
+# the possible values of a CPE's part component, keyed by their formatted string representation
+_PARTS_BY_VALUE: Dict[str, Union[Part, Logical]] = {
+    **{part.value: part for part in Part},
+    **{logical.value: logical for logical in Logical}
+}
+
+
+_REGION_CODE_MATCH = re.compile(r"[A-Za-z]{2}").fullmatch
+
+
 class Language:
+    __slots__ = ("code", "region", "_str", "_hash")
+
     def __init__(self, iso_639_code: str, region: Optional[Union[str, int]] = None):
         if not (2 <= len(iso_639_code) <= 3):
             raise ValueError(f"Invalid ISO 639 language code: {iso_639_code!r}")
         elif region == "":
             region = None
         elif isinstance(region, str):
-            if len(region) != 2:
-                if len(region) == 3:
-                    # see if it is actually a three digit UN M.49 code:
-                    try:
-                        region = int(region)
-                    except ValueError:
-                        pass
-                if isinstance(region, str):
-                    raise ValueError(f"Invalid ISO 3166-1 region code: {region!r}")
-            elif not re.match(r"[A-Za-z]{2}", region):
-                raise ValueError(f"Invalid ISO 3166-1 region code: {region!r}")
-            else:
+            if len(region) == 2 and _REGION_CODE_MATCH(region):
                 region = region.lower()
+            elif len(region) == 3:
+                # see if it is actually a three digit UN M.49 code:
+                try:
+                    region = int(region)
+                except ValueError:
+                    raise ValueError(f"Invalid ISO 3166-1 region code: {region!r}") from None
+            else:
+                raise ValueError(f"Invalid ISO 3166-1 region code: {region!r}")
         elif isinstance(region, int) and (region < 0 or region > 999):
             raise ValueError(f"Invalid UN M.49 region code: {region!r}")
-        self.code: str = iso_639_code.lower()
+        self.code: str = intern(iso_639_code.lower())
         self.region: Optional[Union[str, int]] = region
+        # Languages are treated as immutable, so their string form is computed once up front and their hash the first
+        # time it is needed
+        if region is None:
+            self._str: str = self.code
+        elif isinstance(region, int):
+            self._str = f"{self.code}-{region:03}"
+        else:
+            self._str = f"{self.code}-{region}"
+        self._hash: Optional[int] = None
 
     def __eq__(self, other):
         return (isinstance(other, Language) and other.code == self.code and other.region == self.region) or (
-                    isinstance(other, str) and (
-                        (self.region is None and self.code == other) or
-                        (self.region is not None and str(self) == other)
-                    )
+                    isinstance(other, str) and self._str == other
         )
 
     def __hash__(self):
-        if self.region is None:
-            return hash((self.code, ""))
-        else:
-            return hash((self.code, str(self.region)))
+        if self._hash is None:
+            self._hash = hash((self.code, "" if self.region is None else str(self.region)))
+        return self._hash
+
+    def __reduce__(self):
+        # the cached hash is only valid in this process, since string hashes are salted
+        return self.__class__, (self.code, self.region)
 
     def __lt__(self, other):
-        return str(self) < str(other)
+        return self._str < str(other)
 
     def __str__(self):
-        if self.region is None:
-            return self.code
-        elif isinstance(self.region, int):
-            return f"{self.code}-{self.region:03}"
-        else:
-            return f"{self.code}-{self.region}"
+        return self._str
 
     def __repr__(self):
         return f"{self.__class__.__name__}(iso_639_code={self.code!r}, region={self.region!r})"
@@ -148,7 +192,14 @@ class Language:
 AVString = Union[str, Logical]
 
 
-@dataclass(unsafe_hash=True, frozen=True, order=True)
+@lru_cache(maxsize=4096)
+def _language(iso_639_code: str, region: Optional[str]) -> Language:
+    # the same handful of languages appear over and over again in the NVD feeds, and Languages are never modified
+    # after construction, so parsed CPEs can all share the same instances
+    return Language(iso_639_code=iso_639_code, region=region)
+
+
+@dataclass(frozen=True, order=True)
 class CPE(Testable):
     part: Union[Part, Logical] = Logical.ANY
     vendor: AVString = Logical.ANY
@@ -162,9 +213,27 @@ class CPE(Testable):
     target_hw: AVString = Logical.ANY
     other: AVString = Logical.ANY
 
+    def __hash__(self):
+        # CPEs are frozen, so the hash of their fields only needs to be computed once
+        h = self.__dict__.get("_hash", None)
+        if h is None:
+            h = hash((
+                self.part, self.vendor, self.product, self.version, self.update, self.edition, self.lang,
+                self.sw_edition, self.target_sw, self.target_hw, self.other
+            ))
+            object.__setattr__(self, "_hash", h)
+        return h
+
+    def __getstate__(self):
+        # String hashes are salted per process, so the cached hash must not outlive this process; the cached formatted
+        # string is cheap to rebuild, so it is dropped too rather than bloating pickles
+        return {
+            name: value for name, value in self.__dict__.items() if name not in ("_hash", "_formatted_string")
+        }
+
     def is_complete_wildcard(self) -> bool:
-        for field in fields(self.__class__):
-            if getattr(self, field.name) != Logical.ANY:
+        for name in _CPE_FIELD_NAMES:
+            if getattr(self, name) is not _ANY:
                 return False
         return True
 
@@ -174,29 +243,44 @@ class CPE(Testable):
 
     @staticmethod
     def _match(a, b) -> bool:
-        if isinstance(a, Logical):
-            if a == Logical.ANY:
-                return True
-            else:
-                return b == Logical.NA
-        elif isinstance(b, Logical):
-            if b == Logical.ANY:
-                return True
-            else:
-                return a == Logical.NA
+        # enum members are singletons, so identity checks suffice
+        if a is _ANY:
+            return True
+        elif a is _NA:
+            return b is _NA
+        elif b is _ANY:
+            return True
+        elif b is _NA:
+            return False
         return a == b
 
     def match(self, cpe: "CPE", match_version: bool = True) -> bool:
-        return all(CPE._match(getattr(self, attr), getattr(cpe, attr)) for attr in (
-            "part", "vendor", "product", "update", "edition", "lang", "sw_edition", "target_sw",
-            "target_hw", "other"
-        )) and (not match_version or CPE._match(self.version, cpe.version))
+        # this is the innermost loop of configuration matching, so it is spelled out field-by-field rather than
+        # iterating over the field names with getattr
+        _match = CPE._match
+        return _match(self.part, cpe.part) and \
+            _match(self.vendor, cpe.vendor) and \
+            _match(self.product, cpe.product) and \
+            _match(self.update, cpe.update) and \
+            _match(self.edition, cpe.edition) and \
+            _match(self.lang, cpe.lang) and \
+            _match(self.sw_edition, cpe.sw_edition) and \
+            _match(self.target_sw, cpe.target_sw) and \
+            _match(self.target_hw, cpe.target_hw) and \
+            _match(self.other, cpe.other) and \
+            (not match_version or _match(self.version, cpe.version))
 
     def formatted_string(self) -> str:
-        return "cpe:2.3:" + ":".join(str(getattr(self, attr)) for attr in (
-            "part", "vendor", "product", "version", "update", "edition", "lang", "sw_edition", "target_sw",
-            "target_hw", "other"
-        ))
+        # CPEs are frozen, so the formatted string is only built the first time it is requested and then cached
+        fs = self.__dict__.get("_formatted_string", None)
+        if fs is None:
+            fs = "cpe:2.3:" + ":".join((
+                str(self.part), str(self.vendor), str(self.product), str(self.version), str(self.update),
+                str(self.edition), str(self.lang), str(self.sw_edition), str(self.target_sw), str(self.target_hw),
+                str(self.other)
+            ))
+            object.__setattr__(self, "_formatted_string", fs)
+        return fs
 
     __str__ = formatted_string
 
@@ -206,17 +290,22 @@ class CPE(Testable):
 
     @classmethod
     def load_content(cls: Type[T], stream: TextIO) -> T:
-        return parse_formatted_string(stream.readline())
+        return parse_formatted_string(stream.readline().rstrip("\n"))
 
     def vulnerable_cpes(self) -> Iterator["CPE"]:
         yield self
 
 
+_CPE_FIELD_NAMES: Tuple[str, ...] = tuple(field.name for field in fields(CPE))
+
+
 class FormattedStringError(ValueError):
     pass
 
 
 class ParseContext:
+    __slots__ = ("parser", "_start_offset")
+
     def __init__(self, parser: "FormattedStringParser"):
         self.parser: FormattedStringParser = parser
         self._start_offset: int = self.parser.offset
@@ -231,6 +320,8 @@ class ParseContext:
 
 
 class FormattedStringParser:
+    __slots__ = ("fs", "offset")
+
     def __init__(self, fs: str):
         self.fs: str = fs
         self.offset: int = 0
@@ -246,66 +337,93 @@ class FormattedStringParser:
                                    f"{' ' * self.offset}{'^' * len(expected)}\n")
 
     def expect(self, text: str):
-        if self.offset >= len(self.fs) or self.fs[self.offset:self.offset + len(text)] != text:
-            if not text:
-                return ""
+        if text and not self.fs.startswith(text, self.offset):
             self.error(text)
         self.offset += len(text)
 
     def up_to(self, delimiter: str, consume_delimiter: bool = True) -> str:
-        i = self.fs[self.offset:].find(delimiter)
+        i = self.fs.find(delimiter, self.offset)
         if i < 0:
             raise FormattedStringError(f"Reached the end of the formatted string when searching for {delimiter} from "
                                        f"offset {self.offset}")
-        ret = self.fs[self.offset:self.offset + i]
-        self.offset += i
+        ret = self.fs[self.offset:i]
         if consume_delimiter:
-            self.offset += len(delimiter)
+            self.offset = i + len(delimiter)
+        else:
+            self.offset = i
         return ret
 
+    def _next_colon(self) -> int:
+        i = self.fs.find(":", self.offset)
+        if i < 0:
+            return len(self.fs)
+        return i
+
     def peek(self) -> str:
         return self.fs[self.offset:self.offset + 1]
 
     def parse_repeated(
             self, parser: Callable[[], str], at_least: int = 0, at_most: Optional[int] = None
-    ) -> Iterator[str]:
+    ) -> List[str]:
+        """
+        Parses as many consecutive repetitions of `parser` as possible, up to `at_most` of them.
+
+        Raises a `FormattedStringError` if fewer than `at_least` could be parsed.
+
+        """
+        results: List[str] = []
         if at_most is not None and at_most < at_least:
-            return
-        yielded = 0
-        error = None
-        while yielded < at_least and (at_most is None or yielded < at_most):
+            return results
+        while at_most is None or len(results) < at_most:
+            start_offset = self.offset
             try:
-                with self.context():
-                    yield parser()
-                yielded += 1
-            except FormattedStringError as e:
-                error = e
+                results.append(parser())
+            except FormattedStringError:
+                self.offset = start_offset
+                if len(results) < at_least:
+                    raise
                 break
-        if yielded < at_least:
-            assert error is not None
-            raise error
+            if self.offset == start_offset:
+                # the parser did not consume anything, so it would keep matching forever
+                break
+        return results
 
     def parse_avstring(self) -> Union[str, Logical]:
-        m = AV_STRING_REGEX.match(self.fs[self.offset:])
+        # most components are a lone wildcard, so check for those before resorting to the regex
+        fs = self.fs
+        offset = self.offset
+        next_offset = offset + 1
+        if next_offset == len(fs) or fs.startswith(":", next_offset):
+            c = fs[offset:next_offset]
+            if c == "*":
+                self.offset = next_offset
+                return _ANY
+            elif c == "-":
+                self.offset = next_offset
+                return _NA
+        m = _AV_STRING_MATCH(fs, offset)
         if m:
-            match = m.group(1)
-            self.offset += len(match)
+            match = m.group()
+            self.offset = m.end()
             if match == "*":
-                return Logical.ANY
+                return _ANY
             elif match == "-":
-                return Logical.NA
+                return _NA
             else:
-                return match
-        next_colon = self.offset + self.fs[self.offset:].find(":")
+                # The same vendors, products, and versions recur across a huge number of CPEs in the NVD feeds, so
+                # interning them saves a lot of memory when loading them and lets string comparisons between parsed
+                # CPEs short-circuit on identity
+                return intern(match)
+        next_colon = self._next_colon()
         raise FormattedStringError(f"Invalid string {self.fs[self.offset:next_colon]!r}\n{self.fs}\n"
                                    f"{' ' * self.offset}{'^' * (next_colon - self.offset)}")
 
     def parse_langtag(self) -> Language:
-        m = LANGTAG_REGEX.match(self.fs[self.offset:])
+        m = _LANGTAG_MATCH(self.fs, self.offset)
         if m:
-            self.offset += len(m.group(1))
-            return Language(iso_639_code=m.group(2), region=m.group(4))
-        next_colon = self.offset + self.fs[self.offset:].find(":")
+            self.offset = m.end()
+            return _language(m.group(1), m.group(2))
+        next_colon = self._next_colon()
         raise FormattedStringError(f"Invalid language tag {self.fs[self.offset:next_colon]!r}\n{self.fs}\n"
                                    f"{' ' * self.offset}{'^' * (next_colon - self.offset)}")
 
@@ -313,10 +431,10 @@ class FormattedStringParser:
         next_char = self.peek()
         if next_char == "*":
             self.offset += 1
-            return Logical.ANY
+            return _ANY
         elif next_char == "-":
             self.offset += 1
-            return Logical.NA
+            return _NA
         return self.parse_langtag()
 
     def parse(self) -> CPE:
@@ -326,17 +444,9 @@ class FormattedStringParser:
         if version != "2.3":
             raise FormattedStringError(f"Invalid version CPE version \"{version}\"; only 2.3 is currently supported")
         part_char = self.up_to(":")
-        for part_possibility in Part:
-            if part_possibility.value == part_char:
-                part = part_possibility
-                break
-        else:
-            if part_char == "*":
-                part = Logical.ANY
-            elif part_char == "-":
-                part = Logical.NA
-            else:
-                raise FormattedStringError(f"Invalid CPE part specifier: {part_char!r}")
+        part = _PARTS_BY_VALUE.get(part_char, None)
+        if part is None:
+            raise FormattedStringError(f"Invalid CPE part specifier: {part_char!r}")
         vendor = self.parse_avstring()
         self.expect(":")
         product = self.parse_avstring()
@@ -371,7 +481,64 @@ class FormattedStringParser:
         )
 
 
+def _formatted_string_pattern() -> "re.Pattern":
+    av = f"({_AV_STRING_PATTERN.pattern})"
+    return re.compile(
+        rf"cpe:2\.3:([hoa*-]):{av}:{av}:{av}:{av}:{av}:(\*|-|{_LANGTAG_PATTERN.pattern}):{av}:{av}:{av}:{av}"
+    )
+
+
+# Matches an entire formatted string in a single call. Group 1 is the part, groups 2 through 6 are the vendor through
+# edition, group 7 is the language (with its code and region in groups 8 and 9), and groups 10 through 13 are the
+# remaining attribute-value strings. Like `FormattedStringParser`, anything following the last component is ignored.
+_FORMATTED_STRING_MATCH = _formatted_string_pattern().match
+
+
+def _avstring_group(value: str) -> AVString:
+    if value == "*":
+        return _ANY
+    elif value == "-":
+        return _NA
+    # interned for the same reasons as in `FormattedStringParser.parse_avstring`
+    return intern(value)
+
+
+def _cpe_from_match(m: "re.Match") -> CPE:
+    part, vendor, product, version, update, edition, lang_str, code, region, sw_edition, target_sw, target_hw, \
+        other = m.groups()
+    if lang_str == "*":
+        lang: Union[Language, Logical] = _ANY
+    elif lang_str == "-":
+        lang = _NA
+    else:
+        lang = _language(code, region)
+    return CPE(
+        part=_PARTS_BY_VALUE[part],
+        vendor=_avstring_group(vendor),
+        product=_avstring_group(product),
+        version=_avstring_group(version),
+        update=_avstring_group(update),
+        edition=_avstring_group(edition),
+        lang=lang,
+        sw_edition=_avstring_group(sw_edition),
+        target_sw=_avstring_group(target_sw),
+        target_hw=_avstring_group(target_hw),
+        other=_avstring_group(other)
+    )
+
+
+# the maximum number of distinct formatted strings whose parsed CPEs are memoized by `parse_formatted_string`
+PARSE_CACHE_SIZE: int = 65536
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse_formatted_string(fs: str) -> CPE:
+    # The same CPEs appear in the configurations of a great many CVEs, and CPEs are immutable, so repeated strings
+    # share a single parsed instance
+    m = _FORMATTED_STRING_MATCH(fs)
+    if m is not None:
+        return _cpe_from_match(m)
+    # the general parser is only needed to produce a helpful error message
     return FormattedStringParser(fs).parse()
 
 
@@ -380,16 +547,26 @@ class TestError(ValueError):
 
 
 class LogicalTest(Testable, ABC):
+    __slots__ = ("children", "negate", "_hash")
+
     def __init__(self, children: Iterable[Union["LogicalTest", CPE]], negate: bool = False):
         self.children: Tuple[Union[LogicalTest, CPE], ...] = tuple(children)
         self.negate: bool = negate
+        self._hash: Optional[int] = None
 
     def __eq__(self, other):
         return isinstance(other, LogicalTest) and other.uid == self.uid and other.negate == self.negate and \
                other.children == self.children
 
     def __hash__(self):
-        return hash((self.negate,) + self.children)
+        if self._hash is None:
+            self._hash = hash((self.negate,) + self.children)
+        return self._hash
+
+    def __reduce__(self):
+        # rebuild from the children alone: the cached hash is only valid in this process, since string hashes are
+        # salted, and subclasses' indexes are cheap to rebuild
+        return self.__class__, (self.children, self.negate)
 
     @classmethod
     def load_content(cls: Type[T], stream: TextIO) -> T:
@@ -416,28 +593,68 @@ class LogicalTest(Testable, ABC):
 
 
 class And(LogicalTest):
+    __slots__ = ()
+
     uid = "a"
 
     def match(self, cpe: CPE) -> bool:
-        result = all(child.match(cpe) for child in self.children)
-        if self.negate:
-            return not result
-        else:
-            return result
+        for child in self.children:
+            if not child.match(cpe):
+                return self.negate
+        return not self.negate
+
+
+def _vendor(testable: Testable) -> Optional[AVString]:
+    if isinstance(testable, CPE):
+        return testable.vendor
+    elif isinstance(testable, VersionRange) and isinstance(testable.wrapped, CPE):
+        return testable.wrapped.vendor
+    return None
+
+
+# `Or` only indexes its children by vendor when it has at least this many of them
+OR_INDEX_MIN_CHILDREN: int = 8
 
 
 class Or(LogicalTest):
+    __slots__ = ("_by_vendor", "_unindexed")
+
     uid = "o"
 
+    def __init__(self, children: Iterable[Union["LogicalTest", CPE]], negate: bool = False):
+        super().__init__(children, negate)
+        self._by_vendor: Optional[Dict[str, Tuple[Testable, ...]]] = None
+        self._unindexed: Tuple[Testable, ...] = ()
+
+    def _build_index(self):
+        # A child whose vendor is a string can only match CPEs with exactly that vendor, so when matching a CPE with a
+        # known vendor, only those children and the ones that could match any vendor need to be checked
+        by_vendor: Dict[str, List[Testable]] = {}
+        unindexed: List[Testable] = []
+        for child in self.children:
+            vendor = _vendor(child)
+            if isinstance(vendor, str):
+                by_vendor.setdefault(vendor, []).append(child)
+            else:
+                unindexed.append(child)
+        self._unindexed = tuple(unindexed)
+        self._by_vendor = {vendor: tuple(children) + self._unindexed for vendor, children in by_vendor.items()}
+
     def match(self, cpe: CPE) -> bool:
-        result = any(child.match(cpe) for child in self.children)
-        if self.negate:
-            return not result
-        else:
-            return result
+        children = self.children
+        if isinstance(cpe.vendor, str) and len(children) >= OR_INDEX_MIN_CHILDREN:
+            if self._by_vendor is None:
+                self._build_index()
+            children = self._by_vendor.get(cpe.vendor, self._unindexed)
+        for child in children:
+            if child.match(cpe):
+                return not self.negate
+        return self.negate
 
 
 class Negate(Testable):
+    __slots__ = ("wrapped",)
+
     uid = "!"
 
     def __init__(self, wrapped: Testable):
@@ -463,7 +680,53 @@ class Negate(Testable):
         return iter(())
 
 
+VersionKey = Tuple[Tuple[int, Union[int, str]], ...]
+
+_VERSION_COMPONENTS = re.compile(r"\d+|[^\W\d_]+").findall
+
+# The first element of each component of a `VersionKey`. Pre-release tags sort before the end of a version, so that
+# `"1.0rc1" < "1.0"`, and every other component sorts after it, so that `"1.0" < "1.0.1"` and `"1.0.1" < "1.0.1a"`.
+_PRE_RELEASE_COMPONENT: int = 0
+_END_COMPONENT: int = 1
+_NUMERIC_COMPONENT: int = 2
+_ALPHABETIC_COMPONENT: int = 3
+
+# pre-release tags, ranked in the order that PEP 440 gives them
+_PRE_RELEASE_RANKS: Dict[str, int] = {
+    "dev": 0, "a": 1, "alpha": 1, "b": 2, "beta": 2, "c": 3, "pre": 3, "preview": 3, "rc": 3
+}
+
+
+@lru_cache(maxsize=65536)
+def version_key(version: str) -> VersionKey:
+    """
+    Returns a key that orders version strings component-wise rather than lexicographically, e.g., `"9" < "10"`.
+
+    Numeric components compare as integers and sort before alphabetic ones; punctuation only separates components.
+    Pre-release tags like `"dev"`, `"alpha"`, `"beta"`, and `"rc"` sort before the release itself. A lone `"a"`, `"b"`,
+    or `"c"` is only treated as a pre-release tag when it is followed by a number (e.g., `"1.0a1"`), since versions like
+    OpenSSL's `"1.0.1a"` come after `"1.0.1"`.
+
+    """
+    components = _VERSION_COMPONENTS(version)
+    key: List[Tuple[int, Union[int, str]]] = []
+    for i, component in enumerate(components):
+        if component.isdecimal():
+            key.append((_NUMERIC_COMPONENT, int(component)))
+            continue
+        component = component.lower()
+        rank = _PRE_RELEASE_RANKS.get(component, None)
+        if rank is not None and (len(component) > 1 or (i + 1 < len(components) and components[i + 1].isdecimal())):
+            key.append((_PRE_RELEASE_COMPONENT, rank))
+        else:
+            key.append((_ALPHABETIC_COMPONENT, component))
+    key.append((_END_COMPONENT, 0))
+    return tuple(key)
+
+
 class VersionRange(Testable):
+    __slots__ = ("wrapped", "start", "end", "include_start", "include_end", "_start_key", "_end_key")
+
     uid = "v"
 
     def __init__(
@@ -479,6 +742,8 @@ class VersionRange(Testable):
         self.end: Optional[str] = end
         self.include_start: bool = include_start
         self.include_end: bool = include_end
+        self._start_key: Optional[VersionKey] = None if start is None else version_key(start)
+        self._end_key: Optional[VersionKey] = None if end is None else version_key(end)
 
     def __eq__(self, other):
         return isinstance(other, VersionRange) and self.start == other.start and self.end == other.end and \
@@ -490,17 +755,18 @@ class VersionRange(Testable):
 
     def match(self, cpe: "CPE") -> bool:
         if isinstance(cpe.version, str):
-            if self.start is not None:
+            version = version_key(cpe.version)
+            if self._start_key is not None:
                 if self.include_start:
-                    if cpe.version < self.start:
+                    if version < self._start_key:
                         return False
-                elif cpe.version <= self.start:
+                elif version <= self._start_key:
                     return False
-            elif self.end is not None:
+            if self._end_key is not None:
                 if self.include_end:
-                    if cpe.version > self.end:
+                    if version > self._end_key:
                         return False
-                elif cpe.version >= self.end:
+                elif version >= self._end_key:
                     return False
         return self.wrapped.match(cpe, match_version=False)
 
@@ -3,7 +3,7 @@ from collections.abc import Sequence
 from dataclasses import dataclass
 from datetime import datetime
 from enum import IntEnum
-from typing import Iterable, Iterator, Optional, overload, TextIO, Tuple, Union
+from typing import Dict, Iterable, Iterator, Optional, overload, TextIO, Tuple, Union
 import sys
 
 from cvss import CVSS2, CVSS3
@@ -17,6 +17,25 @@ if sys.version_info < (3, 9):
 else:
     TestableSequence = Sequence[Testable]
 
+if sys.version_info >= (3, 8):
+    from functools import cached_property
+else:
+    # functools.cached_property was added in Python 3.8
+    class cached_property:
+        def __init__(self, func):
+            self.func = func
+            self.__doc__ = func.__doc__
+
+        def __set_name__(self, owner, name):
+            self.name = name
+
+        def __get__(self, instance, owner=None):
+            if instance is None:
+                return self
+            # write straight to the instance dict, which also works for frozen dataclasses
+            value = instance.__dict__[self.name] = self.func(instance)
+            return value
+
 
 class Severity(IntEnum):
     NONE = 0
@@ -40,6 +59,8 @@ class Description:
 
 
 class Configurations(TestableSequence, Testable):
+    __slots__ = ("testable",)
+
     uid = "C"
 
     def __init__(self, testable: Iterable[Testable]):
@@ -77,10 +98,10 @@ class Configurations(TestableSequence, Testable):
         return Configurations(Testable.load(stream) for _ in range(num_children))
 
     def match(self, cpe: CPE) -> bool:
-        for child in self:
+        for child in self.testable:
             if child.match(cpe):
                 return True
-        return any(child.match(cpe) for child in self)
+        return False
 
     def __repr__(self):
         return f"{self.__class__.__name__}({self.testable!r})"
@@ -101,13 +122,21 @@ class CVE:
     assigner: Optional[str] = None
     configurations: Configurations = Configurations(())
 
-    def description(self, lang: str = "en") -> Optional[str]:
+    # CVEs are immutable, so the properties below are computed at most once per instance. functools.cached_property
+    # stores its value directly in the instance's __dict__, so it works even though the dataclass is frozen.
+
+    @cached_property
+    def _descriptions_by_lang(self) -> Dict[str, str]:
+        descriptions: Dict[str, str] = {}
         for d in self.descriptions:
-            if d.lang == lang:
-                return d.value
-        return None
+            # the first description in each language takes precedence
+            descriptions.setdefault(d.lang, d.value)
+        return descriptions
+
+    def description(self, lang: str = "en") -> Optional[str]:
+        return self._descriptions_by_lang.get(lang, None)
 
-    @property
+    @cached_property
     def severity(self) -> Severity:
         if isinstance(self.impact, CVSS2):
             if self.impact.base_score < 4.0:
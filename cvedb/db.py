@@ -1,21 +1,119 @@
+import atexit
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
 import itertools
 from pathlib import Path
 from sqlite3 import connect, Connection
+from threading import local
 from time import time
-from typing import Iterable, Iterator, List, Optional, Sized, Union
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Sized, Tuple, Union
 
 from tqdm import tqdm
 
 from .cve import CVE
 from .feed import Data, DataSource, Feed, FEEDS, MAX_DATA_AGE_SECONDS
-from .schemas import Schema
+from .schemas import ADD_BATCH_SIZE, Schema
 from .search import SearchQuery, Sort
+from .sql import batched, fetch_rows, in_list
 
 DEFAULT_DB_PATH = Path.home() / ".config" / "cvedb" / "cvedb.sqlite"
 
 UPDATE_INTERVAL_SECONDS: int = MAX_DATA_AGE_SECONDS
 
+# memory-map up to this many bytes of the database so that scans read straight from the OS page cache
+MMAP_SIZE_BYTES: int = 256 * 1024 * 1024
+# the size of SQLite's own page cache; negative values are in KiB rather than pages
+CACHE_SIZE_KIB: int = 64 * 1024
+
+# the maximum number of parent feeds to download and parse at the same time when updating
+MAX_CONCURRENT_FEED_LOADS: int = 4
+
+
+class _ConnectionPool(local):
+    """
+    The open connections of a single thread (SQLite connections may only be used by the thread that created them).
+
+    They are reused by subsequent `CVEdbContext`s rather than reopened each time, and closed by `close_connections`
+    when the interpreter exits. Since the pool is thread-local, the connections of other threads are released when
+    those threads exit.
+
+    """
+    def __init__(self):
+        # open connections, keyed by database path
+        self.connections: Dict[Path, Connection] = {}
+        # The number of `CVEdbContext`s currently using each open connection. Nested contexts on the same database
+        # share a connection, so only the outermost one may commit or roll back its transaction.
+        self.users: Dict[Connection, int] = {}
+
+
+_POOL = _ConnectionPool()
+
+
+def _connect(db_path: Path) -> Connection:
+    key = db_path.resolve()
+    connection = _POOL.connections.get(key, None)
+    if connection is None:
+        connection = connect(str(db_path))
+        # Write-ahead logging lets readers proceed while a feed update is being written, and with WAL it is safe
+        # to only sync at checkpoints rather than on every commit
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute(f"PRAGMA mmap_size = {MMAP_SIZE_BYTES}")
+        connection.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+        # keep the temporary B-trees used for sorting and DISTINCT in search results out of the filesystem
+        connection.execute("PRAGMA temp_store = MEMORY")
+        _POOL.connections[key] = connection
+    _POOL.users[connection] = _POOL.users.get(connection, 0) + 1
+    return connection
+
+
+def _release(connection: Connection) -> bool:
+    """Stops using a connection returned by `_connect`, returning whether it was the connection's last user"""
+    users = _POOL.users.get(connection, 1) - 1
+    if users > 0:
+        _POOL.users[connection] = users
+        return False
+    _POOL.users.pop(connection, None)
+    return True
+
+
+def close_connections():
+    """
+    Closes the calling thread's database connections that are being kept open for reuse.
+
+    Connections opened by other threads cannot be closed from this one, and connections still in use by a
+    `CVEdbContext` are left open.
+
+    """
+    for key, connection in list(_POOL.connections.items()):
+        if connection not in _POOL.users:
+            del _POOL.connections[key]
+            connection.close()
+
+
+atexit.register(close_connections)
+
+
+class DataSnapshot(Data):
+    """
+    A point-in-time stand-in for database-backed data that can be safely passed to a parent feed's `reload` on a
+    different thread.
+
+    It records the last modified date and number of CVEs, which is all a parent feed needs to decide whether the
+    existing data is out of date, but it does not hold the CVEs themselves.
+
+    """
+    def __init__(self, data: Data):
+        super().__init__(data.last_modified_date)
+        self.size: int = len(data)
+
+    def __iter__(self) -> Iterator[CVE]:
+        raise TypeError(f"{self.__class__.__name__} does not retain its CVEs and cannot be iterated")
+
+    def __len__(self):
+        return self.size
+
 
 class CVEdbDataSource(DataSource):
     def __init__(self, source: Union["DbBackedFeed", "CVEdb"]):
@@ -25,42 +123,68 @@ class CVEdbDataSource(DataSource):
             self.feeds: Iterable[DbBackedFeed] = source.feeds
         else:
             self.feeds = [source]
+        self.feed_ids: Tuple[int, ...] = tuple(feed.feed_id for feed in self.feeds)
 
     def __iter__(self) -> Iterator[CVE]:
         c = self.connection.cursor()
-        where_clause = " OR ".join(["feed = ?"] * len(self.feeds))
-        params = tuple(feed.feed_id for feed in self.feeds)
-        c.execute(f"SELECT * FROM cves WHERE {where_clause}", params)
         # The following assumes that all feeds have the same schema, which should always be true
-        yield from self.feeds[0].schema.cve_iter(c.fetchall())
+        schema = self.feeds[0].schema
+        c.execute(f"SELECT {schema.cve_columns()} FROM cves WHERE {in_list('feed', len(self.feed_ids))}", self.feed_ids)
+        yield from schema.cve_iter(fetch_rows(c))
+
+
+def open_schema(connection: Connection) -> Schema:
+    with connection:
+        schema = Schema.open(connection)
+        # this also adds any indexes that are missing from databases created by older versions
+        schema.create_indexes()
+    return schema
 
 
 class DbBackedFeed(Feed):
     register = False
 
-    def __init__(self, connection: Connection, parent: Feed):
+    def __init__(self, connection: Connection, parent: Feed, schema: Optional[Schema] = None):
         super().__init__(parent.name)
         self.parent: Feed = parent
         self.connection: Connection = connection
+        # The last modified and last checked dates are read on nearly every operation but only change when this feed
+        # updates them, so both are fetched together and cached until then
+        self._feed_dates: Optional[Tuple[Optional[datetime], Optional[datetime]]] = None
+        # likewise, the number of CVEs in the feed is cached until the next `store`
+        self._num_cves: Optional[int] = None
+        if schema is None:
+            schema = open_schema(connection)
+        self.schema: Schema = schema
         with self.connection:
-            self.schema: Schema = Schema.open(self.connection)
             self.feed_id: int = self.schema.feed_id(self.parent.name)
 
+    def _dates(self) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """Returns the feed's last modified and last checked dates"""
+        if self._feed_dates is None:
+            c = self.connection.cursor()
+            c.execute("SELECT last_modified, last_checked FROM feeds WHERE rowid = ?", (self.feed_id,))
+            row = c.fetchone()
+            if row is None:
+                return None, None
+            last_modified, last_checked = (
+                None if timestamp is None else datetime.fromtimestamp(timestamp, timezone.utc) for timestamp in row
+            )
+            self._feed_dates = last_modified, last_checked
+        return self._feed_dates
+
     def last_modified(self) -> Optional[datetime]:
-        c = self.connection.cursor()
-        c.execute("SELECT last_modified FROM feeds WHERE rowid = ?", (self.feed_id,))
-        row = c.fetchone()
-        if row is None or row[0] is None:
-            return None
-        return datetime.fromtimestamp(row[0], timezone.utc)
+        return self._dates()[0]
+
+    def num_cves(self) -> int:
+        if self._num_cves is None:
+            c = self.connection.cursor()
+            c.execute("SELECT COUNT(*) FROM cves WHERE feed = ?", (self.feed_id,))
+            self._num_cves = c.fetchone()[0]
+        return self._num_cves
 
     def last_checked(self) -> Optional[datetime]:
-        c = self.connection.cursor()
-        c.execute("SELECT last_checked FROM feeds WHERE rowid = ?", (self.feed_id,))
-        row = c.fetchone()
-        if row is None or row[0] is None:
-            return None
-        return datetime.fromtimestamp(row[0], timezone.utc)
+        return self._dates()[1]
 
     def is_out_of_date(self) -> bool:
         last_checked = self.last_checked()
@@ -76,35 +200,41 @@ class DbBackedFeed(Feed):
                     "UPDATE feeds SET last_checked = ? WHERE rowid = ?",
                     (datetime.fromtimestamp(time()).astimezone().timestamp(), self.feed_id)
                 )
+            self._feed_dates = None
             return out_of_date
 
     def reload(self, existing_data: Optional[Data] = None, force: bool = False) -> DataSource:
         if not force and existing_data is not None and len(existing_data) > 0:
             return existing_data
+        return self.store(self.parent.reload(existing_data), existing_data)
+
+    def store(self, new_data: DataSource, existing_data: Optional[Data] = None) -> DataSource:
+        """Saves `new_data`, as returned by the parent feed's `reload`, to the database"""
+        if new_data is existing_data:
+            return new_data
         with tqdm(desc=self.name, unit=" CVEs", leave=False) as t:
             if existing_data is not None:
                 existing_modified_time = existing_data.last_modified_date
             else:
                 existing_modified_time = None
-            new_data = self.parent.reload(existing_data)
-            if new_data is existing_data:
-                return new_data
             if isinstance(new_data, Sized):
                 t.total = len(new_data)
             with self.connection as c:
                 if existing_modified_time is None or new_data.last_modified_date != existing_modified_time:
-                    for cve in new_data:
-                        self.schema.add(cve, self.feed_id)
-                        t.update(1)
+                    for batch in batched(new_data, ADD_BATCH_SIZE):
+                        self.schema.add_many(batch, self.feed_id)
+                        t.update(len(batch))
                     c.execute(
                         "UPDATE feeds SET last_modified = ? WHERE rowid = ?",
                         (new_data.last_modified_date.astimezone().timestamp(), self.feed_id)
                     )
+                    self._num_cves = None
                 c.execute(
                     "UPDATE feeds SET last_checked = ? WHERE rowid = ?",
                     (datetime.fromtimestamp(time()).astimezone().timestamp(), self.feed_id)
                 )
                 c.commit()
+                self._feed_dates = None
         return CVEdbDataSource(self)
 
     def data(self, force_reload: bool = False) -> "CVEdbData":
@@ -132,14 +262,18 @@ class CVEdbContext:
         db_dir = self.db_path.parent
         if not db_dir.exists():
             db_dir.mkdir(parents=True, exist_ok=True)
-        self._connection = connect(str(self.db_path))
+        self._connection = _connect(self.db_path)
         self._connection.__enter__()
         return CVEdb(self._connection, self.parents)
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self._entries -= 1
         if self._entries == 0:
-            self._connection.__exit__(exc_type, exc_val, exc_tb)
+            if _release(self._connection):
+                if exc_type is None:
+                    # let SQLite refresh the query planner's statistics if they have become stale, e.g., after an update
+                    self._connection.execute("PRAGMA optimize")
+                self._connection.__exit__(exc_type, exc_val, exc_tb)
             self._connection = None
             self._db = None
 
@@ -152,6 +286,7 @@ class CVEdbData(Data):
             self.feeds: Iterable[DbBackedFeed] = source.feeds
         else:
             self.feeds = [source]
+        self.feed_ids: Tuple[int, ...] = tuple(feed.feed_id for feed in self.feeds)
 
     @property
     def schema(self) -> Schema:
@@ -164,11 +299,7 @@ class CVEdbData(Data):
 
     def __len__(self):
         self.reload()
-        c = self.connection.cursor()
-        where_clause = " OR ".join(["feed = ?"] * len(self.feeds))
-        params = tuple(feed.feed_id for feed in self.feeds)
-        c.execute(f"SELECT COUNT(*) FROM cves WHERE {where_clause}", params)
-        return c.fetchone()[0]
+        return sum(feed.num_cves() for feed in self.feeds)
 
     def search(
             self,
@@ -190,12 +321,66 @@ class CVEdbData(Data):
             out_of_date_feeds = [
                 feed for feed in self.feeds if feed.last_checked() is None or feed.last_modified() is None
             ]
-        for feed in tqdm(out_of_date_feeds, desc="updating", unit=" feeds", leave=False):
+        if not out_of_date_feeds:
+            return
+        existing: List[Optional[Data]] = []
+        snapshots: List[Optional[DataSnapshot]] = []
+        for feed in out_of_date_feeds:
             if force:
                 existing_data: Optional[Data] = feed.data()
+                existing.append(existing_data)
+                snapshots.append(DataSnapshot(existing_data))
             else:
-                existing_data = None
-            feed.reload(existing_data, force=True)
+                existing.append(None)
+                snapshots.append(None)
+        with tqdm(total=len(out_of_date_feeds), desc="updating", unit=" feeds", leave=False) as t:
+            remote_loads: List[Tuple[DbBackedFeed, Optional[Data], Optional[DataSnapshot]]] = []
+            for feed, existing_data, snapshot in zip(out_of_date_feeds, existing, snapshots):
+                if feed.parent.reload_is_local(snapshot):
+                    # there is no download to overlap with, so loading on another thread would only cost memory
+                    self._store_reloaded(feed, existing_data, snapshot, feed.parent.reload(snapshot))
+                    t.update(1)
+                else:
+                    remote_loads.append((feed, existing_data, snapshot))
+            if not remote_loads:
+                return
+            # Downloading and parsing the parent feeds does not touch the database, so it is done concurrently.
+            # The parents are only handed snapshots of the existing data, since the SQLite connection must only be
+            # used from this thread, and the results are saved to the database here, in order. Each result holds an
+            # entire parsed feed, so at most `MAX_CONCURRENT_FEED_LOADS` loads are outstanding at a time, and the next
+            # one is only started once the oldest has been stored.
+            loads = iter(remote_loads)
+            pending: Deque[Tuple[DbBackedFeed, Optional[Data], Optional[DataSnapshot], "Future[DataSource]"]] = deque()
+            with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_FEED_LOADS, len(remote_loads))) as executor:
+                try:
+                    while True:
+                        for feed, existing_data, snapshot in itertools.islice(
+                                loads, MAX_CONCURRENT_FEED_LOADS - len(pending)
+                        ):
+                            pending.append(
+                                (feed, existing_data, snapshot, executor.submit(feed.parent.reload, snapshot))
+                            )
+                        if not pending:
+                            break
+                        feed, existing_data, snapshot, future = pending.popleft()
+                        self._store_reloaded(feed, existing_data, snapshot, future.result())
+                        t.update(1)
+                except BaseException:
+                    # Leaving the executor's context waits for every submitted load, so on an error (or a
+                    # KeyboardInterrupt) cancel the loads that have not started yet rather than downloading them for
+                    # nothing
+                    for *_, future in pending:
+                        future.cancel()
+                    raise
+
+    @staticmethod
+    def _store_reloaded(
+            feed: DbBackedFeed, existing_data: Optional[Data], snapshot: Optional[DataSnapshot], new_data: DataSource
+    ):
+        if snapshot is not None and new_data is snapshot:
+            # the parent decided that the existing data is already up to date
+            new_data = existing_data
+        feed.store(new_data, existing_data)
 
 
 class CVEdb(Feed):
@@ -205,7 +390,9 @@ class CVEdb(Feed):
         super().__init__("cves")
         if parents is None:
             parents = FEEDS.values()
-        self.feeds: List[DbBackedFeed] = [DbBackedFeed(connection, parent) for parent in parents]
+        # the schema is shared by all of the feeds, so only check its version and indexes once per database
+        schema = open_schema(connection)
+        self.feeds: List[DbBackedFeed] = [DbBackedFeed(connection, parent, schema) for parent in parents]
         self.connection: Connection = connection
 
     def last_modified(self) -> Optional[datetime]:
@@ -225,3 +412,14 @@ class CVEdb(Feed):
     @staticmethod
     def open(db_path: Union[str, Path] = DEFAULT_DB_PATH, parents: Optional[Iterable[Feed]] = None) -> CVEdbContext:
         return CVEdbContext(db_path, parents)
+
+    @staticmethod
+    def shutdown():
+        """
+        Closes the calling thread's database connections that are kept open between calls to `CVEdb.open`.
+
+        Connections still in use by an open database are left open. This happens automatically when the interpreter
+        exits. Databases can still be opened again afterward.
+
+        """
+        close_connections()
@@ -60,9 +60,9 @@ class Data(DataSource, Sized, ABC):
             ascending: bool = True
     ) -> Iterator[CVE]:
         query = Data.make_query(*queries)
-        for cve in sorted(self, key=Data.sort_key(*sort), reverse=not ascending):
-            if query.matches(cve):
-                yield cve
+        # only the matching CVEs need to be held in memory for sorting
+        matches = (cve for cve in self if query.matches(cve))
+        yield from sorted(matches, key=Data.sort_key(*sort), reverse=not ascending)
 
 
 class InMemoryData(Data):
@@ -113,3 +113,7 @@ class Feed(ABC):
     @abstractmethod
     def reload(self, existing_data: Optional[Data] = None) -> DataSource:
         pass
+
+    def reload_is_local(self, existing_data: Optional[Data] = None) -> bool:
+        """Returns whether `reload` would load its data without downloading anything (e.g., from a bundled copy)"""
+        return False
@@ -1,26 +1,37 @@
 from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
 from gzip import decompress
 import itertools
-import json
 from pathlib import Path
-import pkg_resources
 import sys
+import threading
 from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Union
 import urllib.request
 
-from cvss import CVSS2, CVSS3
 from dateutil.parser import isoparse
 from tqdm import tqdm
 
 from .cpe import And, Negate, Or, parse_formatted_string, Testable, VersionRange
 from .cve import Configurations, CVE, Description, Reference
 from .feed import Data, DataSource, Feed
+from .schemas import parse_impact
+from ._version import version
+
+try:
+    # orjson parses the feeds several times faster than the standard library, so use it if it is installed
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 BASE_JSON_URL: str = "https://nvd.nist.gov/feeds/json/cve/1.1/nvdcve-1.1-"
 PRE_SEED_DATA_DIR: Path = Path(__file__).absolute().parent / "data"
 
+# the maximum number of distinct feed timestamps whose parsed datetimes are memoized by `parse_feed_date`
+FEED_DATE_CACHE_SIZE: int = 16384
+
 
+@lru_cache(maxsize=None)
 def camel_to_underscore(text: str) -> str:
     def process(i: int, c: str):
         if i == 0:
@@ -33,6 +44,18 @@ def camel_to_underscore(text: str) -> str:
     return "".join(process(*v) for v in enumerate(text))
 
 
+@lru_cache(maxsize=FEED_DATE_CACHE_SIZE)
+def parse_feed_date(date_str: str) -> datetime:
+    """Parses an ISO 8601 date from a feed, such as `2002-01-01T05:00Z`"""
+    if sys.version_info >= (3, 7):
+        # datetime.fromisoformat is implemented in C, but it does not accept a "Z" suffix prior to Python 3.11
+        try:
+            return datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+        except ValueError:
+            pass
+    return isoparse(date_str)
+
+
 @dataclass(order=True, unsafe_hash=True, frozen=True)
 class Meta:
     last_modified_date: datetime
@@ -145,12 +168,14 @@ class JsonDataSource(DataSource):
             )
             for desc in cve_obj["cve"].get("description", {}).get("description_data", [])
         )
-        published_date = isoparse(cve_obj["publishedDate"])
-        last_modified_date = isoparse(cve_obj["lastModifiedDate"])
+        published_date = parse_feed_date(cve_obj["publishedDate"])
+        last_modified_date = parse_feed_date(cve_obj["lastModifiedDate"])
+        # `parse_impact` picks the CVSS version from the vector's prefix, and shares its parsed scores with those
+        # loaded from the database
         if "baseMetricV3" in cve_obj["impact"]:
-            impact = CVSS3(cve_obj["impact"]["baseMetricV3"]["cvssV3"]["vectorString"])
+            impact = parse_impact(cve_obj["impact"]["baseMetricV3"]["cvssV3"]["vectorString"])
         elif "baseMetricV2" in cve_obj["impact"]:
-            impact = CVSS2(cve_obj["impact"]["baseMetricV2"]["cvssV2"]["vectorString"])
+            impact = parse_impact(cve_obj["impact"]["baseMetricV2"]["cvssV2"]["vectorString"])
         else:
             impact = None
         return CVE(
@@ -179,7 +204,7 @@ class JsonDataSource(DataSource):
 
 
 def download(url: str, size: Optional[int] = None, show_progress: bool = True) -> bytes:
-    cvedb_version = pkg_resources.require("cvedb")[0].version
+    cvedb_version = version()
     request = urllib.request.Request(
         url=url,
         data=None,
@@ -214,22 +239,28 @@ class JsonFeed(Feed):
         self.cached_meta_path: Path = PRE_SEED_DATA_DIR / f"nvdcve-1.1-{self.name}.meta"
         self.cached_json_path: Path = PRE_SEED_DATA_DIR / f"nvdcve-1.1-{self.name}.json.gz"
 
+    def reload_is_local(self, existing_data: Optional[Data] = None) -> bool:
+        # the first time a feed is loaded, the version shipped with CVEdb is used, if it exists
+        return (existing_data is None or len(existing_data) == 0) and self.cached_json_path.exists() and \
+            self.cached_meta_path.exists()
+
     def reload(self, existing_data: Optional[Data] = None) -> DataSource:
-        if existing_data is None or len(existing_data) == 0:
-            # This is our first time loading this feed, so use the version shipped with CVEdb, if it exists:
-            if self.cached_json_path.exists() and self.cached_meta_path.exists():
-                with open(self.cached_meta_path, "r") as meta:
-                    with open(self.cached_json_path, "rb") as compressed_json:
-                        return JsonDataSource.load(json.loads(decompress(compressed_json.read())), Meta.load(meta))
+        if self.reload_is_local(existing_data):
+            with open(self.cached_meta_path, "r") as meta:
+                with open(self.cached_json_path, "rb") as compressed_json:
+                    return JsonDataSource.load(json_loads(decompress(compressed_json.read())), Meta.load(meta))
         with urllib.request.urlopen(self.meta_url) as req:
             new_meta = Meta.load(req)
         if existing_data is not None and existing_data.last_modified_date is not None and \
                 new_meta.last_modified_date <= existing_data.last_modified_date:
             # the existing data is newer
             return existing_data
-        compressed = download(self.gz_url, new_meta.gz_size, sys.stderr.isatty())
-        decompressed = decompress(compressed)
-        data = json.loads(decompressed)
+        # The downloaded and decompressed bytes are only temporaries, so that they can be freed as soon as they are
+        # parsed rather than being kept alive (alongside the parsed JSON) while the CVEs are loaded
+        # Feeds are downloaded concurrently by `CVEdbData.reload`, whose own progress bar already tracks them, so only
+        # show a download progress bar when running on the main thread; otherwise the bars would garble one another
+        show_progress = sys.stderr.isatty() and threading.current_thread() is threading.main_thread()
+        data = json_loads(decompress(download(self.gz_url, new_meta.gz_size, show_progress)))
         return JsonDataSource.load(data, new_meta)
 
 
@@ -3,6 +3,7 @@ import re
 from shutil import get_terminal_size, which
 from subprocess import PIPE, Popen
 import sys
+from textwrap import TextWrapper
 from typing import Callable, Iterable, List, Optional, TextIO
 
 from .cve import CVE, Severity
@@ -10,6 +11,10 @@ from .cve import CVE, Severity
 
 CVE_ID_WIDTH: int = 17
 
+# The maximum number of CVEs to render into memory before writing them to a non-interactive stdout. The first CVE is
+# written on its own, and each batch after that is twice the size of the previous one, up to this many.
+OUTPUT_BATCH_SIZE: int = 1000
+
 
 SEVERITY_COLORS = {
     Severity.UNKNOWN:  "\033[34;1m",  # Blue
@@ -20,6 +25,11 @@ SEVERITY_COLORS = {
     Severity.CRITICAL: "\033[35;1m"   # Magenta
 }
 
+# the fixed, severity-dependent portion of each CVE box, formatted once up front rather than once per CVE
+SEVERITY_LABELS = {
+    severity: f"  Severity: {color}\033[7m{severity.name}\033[0m" for severity, color in SEVERITY_COLORS.items()
+}
+
 
 STRIP_ANSI_REGEX = re.compile(r"""
     \x1b     # literal ESC
@@ -38,6 +48,17 @@ def ansi_len(text: str):
     return len(strip_ansi(text))
 
 
+# reused across rows so that its compiled word-splitting regexes are only built once
+_WRAPPER = TextWrapper(break_long_words=False, break_on_hyphens=False, expand_tabs=False)
+
+
+def _wrap(text: str, width: int, initial_indent: str = "", subsequent_indent: str = "") -> List[str]:
+    _WRAPPER.width = width
+    _WRAPPER.initial_indent = initial_indent
+    _WRAPPER.subsequent_indent = subsequent_indent
+    return _WRAPPER.wrap(text) or [initial_indent]
+
+
 def _print_box_row(
         stream: TextIO,
         columns: int,
@@ -46,7 +67,7 @@ def _print_box_row(
         center: bool = False,
         word_wrap: bool = False,
         hang_indent: str = "",
-        text_splitter: Optional[Callable[[str], List[str]]] = lambda s: s.split(" "),
+        text_splitter: Optional[Callable[[str], List[str]]] = None,
         delimiter: str = " ",
         line_pre: str = "",
         line_post: str = "",
@@ -59,19 +80,26 @@ def _print_box_row(
     text_len = left_len + right_len + ansi_len(prefix)
     if text_len >= columns - 2:
         if word_wrap:
-            desc_words = text_splitter(text)
-            if right_text:
-                desc_words += text_splitter(right_text)
-            lines = [prefix]
-            for word in desc_words:
-                if lines[-1]:
-                    new_line = f"{lines[-1]}{delimiter}{word}"
-                    if ansi_len(f"{line_pre}{new_line}{line_post}") > columns - 2:
-                        new_line = f"{hang_indent}{word}"
-                        lines.append("")
-                else:
-                    new_line = word
-                lines[-1] = new_line
+            if text_splitter is None:
+                # plain whitespace-delimited text
+                if right_text:
+                    text = f"{text} {right_text}"
+                width = columns - 2 - ansi_len(line_pre) - ansi_len(line_post)
+                lines = _wrap(text, width, initial_indent=prefix, subsequent_indent=hang_indent)
+            else:
+                desc_words = text_splitter(text)
+                if right_text:
+                    desc_words += text_splitter(right_text)
+                lines = [prefix]
+                for word in desc_words:
+                    if lines[-1]:
+                        new_line = f"{lines[-1]}{delimiter}{word}"
+                        if ansi_len(f"{line_pre}{new_line}{line_post}") > columns - 2:
+                            new_line = f"{hang_indent}{word}"
+                            lines.append("")
+                    else:
+                        new_line = word
+                    lines[-1] = new_line
             for line in lines:
                 _print_box_row(stream, columns, f"{line_pre}{line}{line_post}")
             return
@@ -119,7 +147,8 @@ def print_cve_tty(cve: CVE, stream: TextIO, term_columns: Optional[int] = None):
     stream.write("╔")
     seps_before = (actual_columns - 4 - len(cve.cve_id)) // 2
     stream.write("═" * seps_before)
-    color = SEVERITY_COLORS[cve.severity]
+    severity = cve.severity
+    color = SEVERITY_COLORS[severity]
     stream.write(f"╡{color}{cve.cve_id}\033[0m╞")
     stream.write("═" * (actual_columns - seps_before - 4 - len(cve.cve_id)))
     stream.write("╗\n")
@@ -131,7 +160,7 @@ def print_cve_tty(cve: CVE, stream: TextIO, term_columns: Optional[int] = None):
         impact_text = f"{cve.impact.base_score:02.1f}"
         if len(impact_text) < 4:
             impact_text += " " * (4 - len(impact_text))
-    _print_box_row(stream, columns, f"  Severity: {color}\033[7m{cve.severity.name}\033[0m",
+    _print_box_row(stream, columns, SEVERITY_LABELS[severity],
                    right_text=f" Impact: {color}\033[7m{impact_text}\033[0m       ")
     _print_box_row(stream, actual_columns, "─" * (actual_columns - 2), left_edge="╟", right_edge="╢")
     _print_box_row(stream, columns, cve.description(), word_wrap=True, line_pre="\033[3m\033[1m", line_post="\033[0m")
@@ -154,39 +183,84 @@ def print_cve_notty(cve: CVE, stream: TextIO):
     stream.write(f"{cve.cve_id}\t{cve.description()}\n")
 
 
+def print_table(rows: List[List[str]], title: str, stream: Optional[TextIO] = None):
+    """Prints a plain ASCII table whose first row is its header, written with a single call to `stream.write`"""
+    if stream is None:
+        stream = sys.stdout
+    num_cols = len(rows[0])
+    col_widths = [max(len(col) for col in column) for column in zip(*rows)]
+    total_width = sum(col_widths) + num_cols + 1
+    separator = f"+{'=' * (total_width - 2)}+\n"
+    if len(title) + 2 > total_width:
+        title = f"{title[:total_width - 5]}..."
+    else:
+        title = f"{' ' * ((total_width - len(title)) // 2)}{title}"
+        title = f"{title}{' ' * (total_width - len(title))}"
+    table = [separator, f"|{title}|\n", separator]
+    for i, row in enumerate(rows):
+        table.append("".join(f"|{col}{' ' * (width - len(col))}" for col, width in zip(row, col_widths)))
+        table.append("|\n")
+        if i == 0:
+            table.append(separator)
+    table.append(separator)
+    stream.write("".join(table))
+
+
 def print_cves(cves: Iterable[CVE], force_color: Optional[bool] = None):
     if force_color is None:
         force_color = sys.stdout.isatty() and sys.stderr.isatty()
 
     if not force_color:
+        buffer = StringIO()
+        buffered = 0
+        batch_size = 1
         for cve in cves:
-            print_cve_notty(cve, sys.stdout)
+            print_cve_notty(cve, buffer)
+            buffered += 1
+            if buffered == batch_size:
+                # flush so that whatever is reading our output sees the results as they are found, rather than once
+                # stdout's own buffer fills up
+                sys.stdout.write(buffer.getvalue())
+                sys.stdout.flush()
+                buffer = StringIO()
+                buffered = 0
+                batch_size = min(batch_size * 2, OUTPUT_BATCH_SIZE)
+        sys.stdout.write(buffer.getvalue())
         return
 
+    # resolve the terminal size once for the whole listing rather than once per CVE
     term_size = get_terminal_size((80, 20))
+    columns = term_size.columns
 
     pager = which("less")
 
     if pager is None:
         for cve in cves:
-            print_cve_tty(cve, sys.stdout, term_size.columns)
+            # render each CVE in memory so it is written to the terminal all at once rather than piecemeal
+            buffer = StringIO()
+            print_cve_tty(cve, buffer, columns)
+            sys.stdout.write(buffer.getvalue())
         return
 
     # expand some CVEs to see if we need to use a pager
     buffer = StringIO()
+    buffered_lines = 1
     pager_proc: Optional[Popen] = None
 
     for cve in cves:
-        print_cve_tty(cve, buffer, term_size.columns)
+        cve_buffer = StringIO()
+        print_cve_tty(cve, cve_buffer, columns)
+        text = cve_buffer.getvalue()
         if pager_proc is not None:
+            pager_proc.stdin.write(text.encode("utf-8"))
+            continue
+        buffer.write(text)
+        buffered_lines += text.count("\n")
+        if buffered_lines >= term_size.lines:
+            # we need to use a pager
+            pager_proc = Popen([pager, "-R"], stdin=PIPE)
             pager_proc.stdin.write(buffer.getvalue().encode("utf-8"))
             buffer = StringIO()
-        else:
-            if pager_proc is None and buffer.getvalue().count("\n") + 1 >= term_size.lines:
-                # we need to use a pager
-                pager_proc = Popen([pager, "-R"], stdin=PIPE)
-                pager_proc.stdin.write(buffer.getvalue().encode("utf-8"))
-                buffer = StringIO()
 
     if pager_proc is None:
         # we didn't need a pager because everything will fit in the terminal
@@ -1,18 +1,19 @@
 from abc import abstractmethod, ABC
 from datetime import datetime, timezone
-from sqlite3 import Connection
+from functools import lru_cache
+from sqlite3 import connect, Connection, OperationalError
 import sys
-from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type, TypeVar, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, TypeVar, Union
 
 from cvss import CVSS2, CVSS3, CVSSError
 
 from .feed import Data
 from .cve import Configurations, CVE, Description, Reference
 from .search import (
-    AfterModifiedDateQuery, AfterPublishedDateQuery, BeforeModifiedDateQuery, BeforePublishedDateQuery, CompoundQuery,
-    CPEQuery, OrQuery, SearchQuery, Sort, TermQuery
+    AfterModifiedDateQuery, AfterPublishedDateQuery, AndQuery, BeforeModifiedDateQuery, BeforePublishedDateQuery,
+    CompoundQuery, CPEQuery, OrQuery, SearchQuery, Sort, TermQuery
 )
-from .sql import And, Select, Or, Query, SimpleQuery, TRUE
+from .sql import And, batched, fetch_rows, in_list, Select, Or, Query, SimpleQuery, TRUE
 
 
 SCHEMAS: Dict[int, Type["Schema"]] = {}
@@ -63,6 +64,61 @@ DESCRIPTIONS_TABLE_CREATE = (
     ")"
 )
 
+# A full-text index of the descriptions table. The trigram tokenizer lets it answer the same substring `LIKE` patterns
+# that term queries use, without evaluating the pattern against every description.
+DESCRIPTIONS_FTS_TABLE_CREATE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS descriptions_fts USING fts5("
+    "description, content='descriptions', tokenize='trigram'"
+    ")"
+)
+
+# The full-text index does not store the descriptions itself, so these triggers keep it in step with every change to
+# the descriptions table, whichever code makes it. They are stored in the database file, so `create_indexes` drops them
+# when the database is opened by a SQLite without FTS5, where they would make every change to the descriptions fail.
+DESCRIPTIONS_FTS_TRIGGERS: Tuple[str, ...] = (
+    "descriptions_fts_insert", "descriptions_fts_delete", "descriptions_fts_update"
+)
+
+DESCRIPTIONS_FTS_TRIGGERS_CREATE = (
+    "CREATE TRIGGER IF NOT EXISTS descriptions_fts_insert AFTER INSERT ON descriptions BEGIN "
+    "INSERT INTO descriptions_fts (rowid, description) VALUES (new.rowid, new.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS descriptions_fts_delete AFTER DELETE ON descriptions BEGIN "
+    "INSERT INTO descriptions_fts (descriptions_fts, rowid, description) VALUES ('delete', old.rowid, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS descriptions_fts_update AFTER UPDATE ON descriptions BEGIN "
+    "INSERT INTO descriptions_fts (descriptions_fts, rowid, description) VALUES ('delete', old.rowid, old.description); "
+    "INSERT INTO descriptions_fts (rowid, description) VALUES (new.rowid, new.description); "
+    "END",
+)
+
+# a trigram index can only narrow down `LIKE` patterns containing at least this many consecutive characters
+FTS_MIN_TERM_LENGTH: int = 3
+
+
+def _fts_supported() -> bool:
+    # FTS5 is an optional SQLite extension, and its trigram tokenizer was only added in SQLite 3.34
+    connection = connect(":memory:")
+    try:
+        connection.execute("CREATE VIRTUAL TABLE fts_test USING fts5(text, tokenize='trigram')")
+    except OperationalError:
+        return False
+    finally:
+        connection.close()
+    return True
+
+
+FTS_SUPPORTED: bool = _fts_supported()
+
+# CVE IDs like "CVE-2020-0001" only consist of these characters; `%` and `_` are included since they are wildcards in a
+# `LIKE` pattern
+_CVE_ID_PATTERN_CHARS = frozenset("CVEcve0123456789-%_")
+
+
+def _could_match_cve_id(term: str) -> bool:
+    return all(char in _CVE_ID_PATTERN_CHARS for char in term)
+
+
 REFERENCES_TABLE_CREATE = (
     "CREATE TABLE IF NOT EXISTS refs("
     "cve REFERENCES cves (id) NOT NULL, "
@@ -97,6 +153,63 @@ CONFIGURATIONS_TABLE_CREATE = (
 )
 
 
+# The primary key of the cves table starts with the CVE ID, so the first index serves the queries that scan a single
+# feed. Without the second, looking up the descriptions of each CVE (as `cve_iter` does) would scan all descriptions.
+# The last two let searches restricted to a range of dates (e.g., `--after` and `--before`) visit only the CVEs in range.
+CVE_INDEXES_CREATE = (
+    "CREATE INDEX IF NOT EXISTS cves_feed_index ON cves (feed, id)",
+    "CREATE INDEX IF NOT EXISTS descriptions_cve_index ON descriptions (cve)",
+    "CREATE INDEX IF NOT EXISTS cves_published_index ON cves (feed, published)",
+    "CREATE INDEX IF NOT EXISTS cves_last_modified_index ON cves (feed, last_modified)",
+)
+
+# The primary key of the configurations table starts with the CPE, so it cannot be used to look up a CVE's CPEs
+V1_INDEXES_CREATE = (
+    "CREATE INDEX IF NOT EXISTS refs_cve_index ON refs (cve)",
+    "CREATE INDEX IF NOT EXISTS configurations_cve_index ON configurations (cve)",
+)
+
+
+# The number of CVEs whose descriptions and references are looked up at once by `cve_iter`. Each CVE is bound to its
+# own variable, and SQLite versions prior to 3.32 allow at most 999 variables per statement.
+LOOKUP_BATCH_SIZE: int = 500
+
+# The number of CVEs passed to each `Schema.add_many` call when a feed is stored. The CVEs' existing rows are deleted
+# with a single statement per table, so the same limit on the number of bound variables applies.
+ADD_BATCH_SIZE: int = LOOKUP_BATCH_SIZE
+
+# the maximum number of distinct timestamps whose datetimes are memoized by `utc_datetime`
+DATETIME_CACHE_SIZE: int = 16384
+
+# the maximum number of distinct impact vectors whose parsed scores are memoized by `parse_impact`
+IMPACT_CACHE_SIZE: int = 4096
+
+
+@lru_cache(maxsize=DATETIME_CACHE_SIZE)
+def utc_datetime(timestamp: float) -> datetime:
+    """Converts a stored timestamp to a datetime"""
+    # Many CVEs in a feed share the same published and last modified times, and datetimes are immutable, so CVEs with
+    # the same timestamp can share a single instance
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+@lru_cache(maxsize=IMPACT_CACHE_SIZE)
+def parse_impact(vector: Optional[str]) -> Optional[Union[CVSS3, CVSS2]]:
+    """Parses a stored impact vector, returning `None` if it is missing or invalid"""
+    # There are only a few dozen distinct vectors across all of the NVD feeds, so CVEs with the same vector share a
+    # single parsed score rather than re-parsing and re-scoring the vector for every row
+    if vector is None:
+        return None
+    # CVSS 3 vectors always start with their version prefix and CVSS 2 vectors never do, so there is no need to try
+    # parsing each vector as CVSS 3 first and fall back to CVSS 2 when that raises
+    try:
+        if vector.startswith("CVSS:3"):
+            return CVSS3(vector)
+        return CVSS2(vector)
+    except CVSSError:
+        return None
+
+
 def register_schema(version: int):
     def decorator(cls):
         if version in SCHEMAS:
@@ -187,6 +300,10 @@ class Schema(ABC):
     def latest() -> Type["Schema"]:
         return SCHEMAS[max(SCHEMAS.keys())]
 
+    @abstractmethod
+    def create_indexes(self):
+        raise NotImplementedError()
+
     @abstractmethod
     def feed_id(self, name: str) -> int:
         raise NotImplementedError()
@@ -195,6 +312,16 @@ class Schema(ABC):
     def add(self, cve: CVE, source_feed: int):
         raise NotImplementedError()
 
+    def add_many(self, cves: Sequence[CVE], source_feed: int):
+        """Adds a batch of at most `ADD_BATCH_SIZE` CVEs"""
+        for cve in cves:
+            self.add(cve, source_feed)
+
+    @abstractmethod
+    def cve_columns(self, table_alias: Optional[str] = None) -> str:
+        """Returns the comma-separated columns of the cves table that must be selected for the rows passed to `cve_iter`"""
+        raise NotImplementedError()
+
     @abstractmethod
     def cve_iter(self, rows: Iterator[Tuple[Union[float, int, str], ...]]) -> Iterator[CVE]:
         raise NotImplementedError()
@@ -212,6 +339,9 @@ class Schema(ABC):
 
 @register_schema(0)
 class SchemaV0(Schema):
+    # the columns of the cves table read by `cve_iter`, in order
+    CVE_COLUMNS: Tuple[str, ...] = ("id", "published", "last_modified", "impact_vector")
+
     @classmethod
     def create(cls: Type[S], connection: Connection, cve_table_create=CVE_TABLE_CREATE_V0) -> S:
         connection.execute(FEED_TABLE_CREATE)
@@ -220,113 +350,180 @@ class SchemaV0(Schema):
         connection.execute("PRAGMA user_version = 0")
         return cls(connection)
 
-    def feed_id(self, name: str) -> int:
+    def create_indexes(self):
+        for statement in CVE_INDEXES_CREATE:
+            self.connection.execute(statement)
+        fts_objects = ("descriptions_fts",) + DESCRIPTIONS_FTS_TRIGGERS
         c = self.connection.cursor()
-        c.execute(f"INSERT OR IGNORE INTO feeds (name) VALUES (?)", (name,))
-        if c.lastrowid is not None and c.lastrowid > 0:
-            return c.lastrowid
+        c.execute(f"SELECT name FROM sqlite_master WHERE {in_list('name', len(fts_objects))}", fts_objects)
+        existing = {name for name, in c.fetchall()}
+        if FTS_SUPPORTED:
+            if len(existing) < len(fts_objects):
+                # The index or its triggers are missing, so some descriptions may not be indexed: the database was
+                # created by a version of cvedb without the index, or it was last written by a SQLite without FTS5.
+                # Since term searches trust the index to find every matching description, it must be rebuilt. Once the
+                # triggers exist they keep the index in step, so this only happens once.
+                self.connection.execute(DESCRIPTIONS_FTS_TABLE_CREATE)
+                for statement in DESCRIPTIONS_FTS_TRIGGERS_CREATE:
+                    self.connection.execute(statement)
+                self.connection.execute("INSERT INTO descriptions_fts (descriptions_fts) VALUES ('rebuild')")
         else:
-            c.execute("SELECT rowid FROM feeds WHERE name = ?", (name,))
-            return c.fetchone()[0]
+            # Term searches fall back to `LIKE` without FTS5, but triggers left by a SQLite with FTS5 would still try
+            # to update the index. Without them the index goes stale, so it is rebuilt the next time the database is
+            # opened with FTS5 support.
+            for name in DESCRIPTIONS_FTS_TRIGGERS:
+                if name in existing:
+                    self.connection.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    def feed_id(self, name: str) -> int:
+        c = self.connection.cursor()
+        # Every feed is looked up each time the database is opened, and the feed almost always already exists, so look
+        # it up first rather than writing (and starting a write transaction) on every open
+        c.execute("SELECT rowid FROM feeds WHERE name = ?", (name,))
+        row = c.fetchone()
+        if row is not None:
+            return row[0]
+        # Another process may add the same feed in the meantime. Note that `lastrowid` cannot be used to tell whether
+        # the insert was ignored, because it then holds the rowid of the last successful insert on the connection.
+        c.execute("INSERT OR IGNORE INTO feeds (name) VALUES (?)", (name,))
+        c.execute("SELECT rowid FROM feeds WHERE name = ?", (name,))
+        return c.fetchone()[0]
 
     @classmethod
     def migrate_from_previous(cls, previous_schema: Schema) -> "SchemaV0":
         raise ValueError("Schema version 0 has no previous version from which to migrate.")
 
-    def add(self, cve: CVE, source_feed: int, **extra_cols):
+    # the columns of the cves table written by `add_many`, in the order of the values returned by `cve_values`
+    INSERT_COLUMNS: Tuple[str, ...] = (
+        "id", "feed", "published", "last_modified", "impact_vector", "base_score", "severity"
+    )
+
+    def cve_values(self, cve: CVE, source_feed: int) -> List[Optional[Union[float, int, str]]]:
         if cve.impact is None:
             impact_vector = None
             base_score = None
         else:
             impact_vector = cve.impact.vector
             base_score = float(cve.impact.base_score)
-        with self.connection as c:
-            col_names = []
-            col_values = []
-            for name, value in extra_cols.items():
-                col_names.append(name)
-                col_values.append(value)
-            extra_col_names = "".join(f", {col}" for col in col_names)
-            c.execute(
-                "INSERT OR REPLACE INTO cves "
-                f"(id, feed, published, last_modified, impact_vector, base_score, severity{extra_col_names}) "
-                f"VALUES (?, ?, ?, ?, ?, ?, ?{', ?' * len(extra_cols)})", [
-                    cve.cve_id, source_feed, cve.published_date.astimezone().timestamp(),
-                    cve.last_modified_date.astimezone().timestamp(), impact_vector, base_score, int(cve.severity)
-                ] + col_values
-            )
-            for description in cve.descriptions:
-                c.execute(
-                    "INSERT OR REPLACE INTO descriptions "
-                    "(cve, lang, description) "
-                    "VALUES (?, ?, ?)", (
-                        cve.cve_id, description.lang, description.value
-                    )
-                )
+        return [
+            cve.cve_id, source_feed, cve.published_date.astimezone().timestamp(),
+            cve.last_modified_date.astimezone().timestamp(), impact_vector, base_score, int(cve.severity)
+        ]
+
+    def add(self, cve: CVE, source_feed: int):
+        self.add_many((cve,), source_feed)
+
+    def add_many(self, cves: Sequence[CVE], source_feed: int):
+        # This does not commit, so that callers like `DbBackedFeed.store` can add an entire feed in one transaction
+        c = self.connection
+        c.executemany(
+            f"INSERT OR REPLACE INTO cves ({', '.join(self.INSERT_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(self.INSERT_COLUMNS))})",
+            [self.cve_values(cve, source_feed) for cve in cves]
+        )
+        # descriptions are not unique per CVE, so remove any from a previous version of these CVEs before re-adding
+        # (the full-text index is updated by its triggers)
+        cve_ids = self._unique_ids(cves)
+        c.execute(f"DELETE FROM descriptions WHERE {in_list('cve', len(cve_ids))}", cve_ids)
+        c.executemany(
+            "INSERT INTO descriptions "
+            "(cve, lang, description) "
+            "VALUES (?, ?, ?)", [
+                (cve.cve_id, description.lang, description.value)
+                for cve in self._last_occurrences(cves) for description in cve.descriptions
+            ]
+        )
+
+    @staticmethod
+    def _last_occurrences(cves: Sequence[CVE]) -> Iterable[CVE]:
+        """Returns the last of the given CVEs with each ID, which is the one whose row in the cves table is kept"""
+        if len(cves) == 1:
+            return cves
+        return {cve.cve_id: cve for cve in cves}.values()
+
+    @staticmethod
+    def _unique_ids(cves: Sequence[CVE]) -> List[str]:
+        return list(dict.fromkeys(cve.cve_id for cve in cves))
+
+    def cve_columns(self, table_alias: Optional[str] = None) -> str:
+        if table_alias is None:
+            return ", ".join(self.CVE_COLUMNS)
+        return ", ".join(f"{table_alias}.{column}" for column in self.CVE_COLUMNS)
+
+    def lookup_by_cve(self, select: str, cve_ids: Sequence[str]) -> Dict[str, List[Tuple[Any, ...]]]:
+        """
+        Runs `select`, which must not have a WHERE clause, for all of the given CVEs in a single query.
+
+        The first column selected must be the CVE ID, which is used to group the resulting rows.
+
+        """
+        c = self.connection.cursor()
+        c.execute(f"{select} WHERE cve IN ({', '.join('?' * len(cve_ids))})", cve_ids)
+        rows_by_cve: Dict[str, List[Tuple[Any, ...]]] = {}
+        for row in fetch_rows(c):
+            rows_by_cve.setdefault(row[0], []).append(row)
+        return rows_by_cve
 
     def cve_iter(
             self,
             rows: Iterator[Tuple[Union[float, int, str], ...]],
             extra_row_handler: Callable[[Tuple[Union[float, int, str], ...], Dict[str, Any]], Any] = lambda *_: None
     ) -> Iterator[CVE]:
-        for cve_id, _, published, last_modified, impact_vector, *extra_rows in rows:
-            if impact_vector is None:
-                impact = None
-            else:
-                try:
-                    impact = CVSS3(impact_vector)
-                except CVSSError:
-                    try:
-                        impact = CVSS2(impact_vector)
-                    except CVSSError:
-                        impact = None
-            d = self.connection.cursor()
-            d.execute(f"SELECT lang, description FROM descriptions WHERE cve = ?", (cve_id,))
-            descriptions = tuple(Description(lang, desc) for lang, desc in d.fetchall())
-            kwargs = {}
-            if extra_rows:
-                extra_row_handler(extra_rows, kwargs)
-            yield CVE(
-                cve_id=cve_id,
-                published_date=datetime.fromtimestamp(published, timezone.utc),
-                last_modified_date=datetime.fromtimestamp(last_modified, timezone.utc),
-                impact=impact,
-                descriptions=descriptions,
-                references=(),  # References are implemented in SchemaV1
-                assigner=None,
-                **kwargs
+        # look up the descriptions of a whole batch of CVEs at once rather than issuing a query per CVE
+        for batch in batched(rows, LOOKUP_BATCH_SIZE):
+            descriptions = self.lookup_by_cve(
+                "SELECT cve, lang, description FROM descriptions", [row[0] for row in batch]
             )
+            for cve_id, published, last_modified, impact_vector, *extra_rows in batch:
+                kwargs = {}
+                if extra_rows:
+                    extra_row_handler(extra_rows, kwargs)
+                yield CVE(
+                    cve_id=cve_id,
+                    published_date=utc_datetime(published),
+                    last_modified_date=utc_datetime(last_modified),
+                    impact=parse_impact(impact_vector),
+                    descriptions=tuple(Description(lang, desc) for _, lang, desc in descriptions.get(cve_id, ())),
+                    references=(),  # References are implemented in SchemaV1
+                    assigner=None,
+                    **kwargs
+                )
 
     @classmethod
     def to_query(cls, query: SearchQuery) -> Optional[Select]:
         if isinstance(query, TermQuery):
-            query_text = query.query
-            description_query = "d.description"
-            id_query = "c.id"
-            if not query.case_sensitive:
-                query_text = query_text.upper()
-                description_query = f"UPPER({description_query})"
-                id_query = f"UPPER({id_query})"
-            return Select("", "", where=SimpleQuery(
-                f"({description_query} LIKE ? OR {id_query} LIKE ?)"
-            ), params=[f"%{query_text}%", f"%{query_text}%"])
+            # SQLite's LIKE is already case-insensitive for ASCII characters, so there is no need to wrap the columns
+            # in UPPER(), which would prevent the pattern from being matched against the column values directly.
+            # Either way, the SQL is only an approximation (for example, `_` in the term is a wildcard), so the term
+            # query is always rechecked in Python, which also takes care of case-sensitive queries.
+            pattern = f"%{query.query}%"
+            if FTS_SUPPORTED and len(query.query) >= FTS_MIN_TERM_LENGTH:
+                description_match = "d.rowid IN (SELECT rowid FROM descriptions_fts WHERE description LIKE ?)"
+            else:
+                description_match = "d.description LIKE ?"
+            # Matching the descriptions in a subquery, rather than joining them to the CVEs, means that each CVE is
+            # produced at most once no matter how many of its descriptions match, so no DISTINCT is needed.
+            description_query = f"c.id IN (SELECT d.cve FROM descriptions d WHERE {description_match})"
+            if not _could_match_cve_id(query.query):
+                # Without a clause on the CVE ID, SQLite can start from the descriptions found by the full-text index
+                # rather than scanning every CVE
+                return Select("", "", where=SimpleQuery(description_query), params=[pattern])
+            return Select("", "", where=SimpleQuery(f"({description_query} OR c.id LIKE ?)"), params=[pattern, pattern])
         elif isinstance(query, BeforePublishedDateQuery):
-            return Select("", "", where=SimpleQuery("c.published <= ?"),
-                          params=[int(query.date.astimezone().timestamp())])
+            # bind the exact timestamp, the same way it is stored by `add`, so that the comparison matches the
+            # Python `matches` implementation
+            return Select("", "", where=SimpleQuery("c.published <= ?"), params=[query.date.timestamp()])
         elif isinstance(query, BeforeModifiedDateQuery):
-            return Select("", "", where=SimpleQuery("c.last_modified <= ?"),
-                          params=[int(query.date.astimezone().timestamp())])
+            return Select("", "", where=SimpleQuery("c.last_modified <= ?"), params=[query.date.timestamp()])
         elif isinstance(query, AfterPublishedDateQuery):
-            return Select("", "", where=SimpleQuery("c.published >= ?"),
-                          params=[int(query.date.astimezone().timestamp())])
+            return Select("", "", where=SimpleQuery("c.published >= ?"), params=[query.date.timestamp()])
         elif isinstance(query, AfterModifiedDateQuery):
-            return Select("", "", where=SimpleQuery("c.last_modified >= ?"),
-                          params=[int(query.date.astimezone().timestamp())])
+            return Select("", "", where=SimpleQuery("c.last_modified >= ?"), params=[query.date.timestamp()])
         elif isinstance(query, CompoundQuery):
             if len(query.sub_queries) == 0:
                 return Select("", "")
             elif len(query.sub_queries) == 1:
-                return cls.to_sql_clause(query.sub_queries[0])
+                return cls.to_query(query.sub_queries[0])
             select: Optional[Select] = None
             sub_selects: List[Select] = []
             params = []
@@ -355,8 +552,8 @@ class SchemaV0(Schema):
         if select is None:
             # the query could not be converted to a SQL query
             raise ValueError("The query could not be converted to a SQL query")
-        feeds_where_clause = SimpleQuery(f"c.feed IN ({', '.join('?' * len(db_data.feeds)) })")
-        params = [feed.feed_id for feed in db_data.feeds]
+        feeds_where_clause = SimpleQuery(in_list("c.feed", len(db_data.feed_ids)))
+        params = list(db_data.feed_ids)
         if select.where is None:
             select.where = feeds_where_clause
             select.params = params
@@ -371,7 +568,7 @@ class SchemaV0(Schema):
                 if s == Sort.CVE_ID:
                     components.append("c.id")
                 elif s == Sort.DESCRIPTION:
-                    components.append("d.description")
+                    components.append("(SELECT MIN(d.description) FROM descriptions d WHERE d.cve = c.id)")
                 elif s == Sort.LAST_MODIFIED_DATE:
                     components.append("c.last_modified")
                 elif s == Sort.PUBLISHED_DATE:
@@ -386,14 +583,38 @@ class SchemaV0(Schema):
             select.order_by = ", ".join(components)
         self.finalize_query(select)
         c.execute(select.to_sql(), select.params)
+        # Stream the CVEs straight off of the cursor rather than materializing every row up front.
         # The following assumes that all feeds have the same schema, which should always be true
-        for cve in self.cve_iter(c.fetchall()):
-            if query.matches(cve):
-                yield cve
+        residual = self.residual_query(query)
+        if residual is None:
+            return self.cve_iter(fetch_rows(c))
+        return (cve for cve in self.cve_iter(fetch_rows(c)) if residual.matches(cve))
+
+    @classmethod
+    def residual_query(cls, query: SearchQuery) -> Optional[SearchQuery]:
+        """
+        Returns the portion of `query` that still needs to be checked in Python after running its SQL translation.
+
+        Date queries are translated to exact SQL comparisons, so they never need to be rechecked. Term queries are
+        only approximated by `LIKE` (which, for example, treats `_` in the term as a wildcard), so they are always
+        rechecked. Returns `None` if the SQL query alone is exact.
+
+        """
+        if isinstance(query, (AfterModifiedDateQuery, AfterPublishedDateQuery, BeforeModifiedDateQuery,
+                              BeforePublishedDateQuery)):
+            return None
+        elif isinstance(query, AndQuery):
+            residuals = [r for r in (cls.residual_query(q) for q in query.sub_queries) if r is not None]
+            if not residuals:
+                return None
+            elif len(residuals) == 1:
+                return residuals[0]
+            return AndQuery(*residuals)
+        return query
 
     def finalize_query(self, select: Select):
-        select.columns = "DISTINCT c.*"
-        select.from_tables = "descriptions d INNER JOIN cves c ON d.cve = c.id"
+        select.columns = self.cve_columns("c")
+        select.from_tables = "cves c"
 
 
 class _CPEQuery(Query):
@@ -407,6 +628,8 @@ class _CPEQuery(Query):
 
 @register_schema(1)
 class SchemaV1(SchemaV0):
+    CVE_COLUMNS: Tuple[str, ...] = SchemaV0.CVE_COLUMNS + ("configurations",)
+
     @classmethod
     def create(cls, connection: Connection) -> "SchemaV1":
         super().create(connection, cve_table_create=CVE_TABLE_CREATE_V1)
@@ -416,6 +639,11 @@ class SchemaV1(SchemaV0):
         connection.execute("PRAGMA user_version = 1")
         return cls(connection)
 
+    def create_indexes(self):
+        super().create_indexes()
+        for statement in V1_INDEXES_CREATE:
+            self.connection.execute(statement)
+
     @classmethod
     def migrate_from_previous(cls: Type[S], previous_schema: SchemaV0) -> S:
         message = "There is no way to migrate from schema version 0 to version 1 without re-downloading all CVEs."
@@ -440,21 +668,35 @@ class SchemaV1(SchemaV0):
             return previous_schema
         previous_schema.connection.execute("DROP TABLE IF EXISTS cves")
         previous_schema.connection.execute("DROP TABLE IF EXISTS feeds")
+        if FTS_SUPPORTED:
+            # Dropping a virtual table requires its module, so without FTS5 the stale index is left in place, and it
+            # is rebuilt by `create_indexes` once the database is next opened with FTS5 support
+            previous_schema.connection.execute("DROP TABLE IF EXISTS descriptions_fts")
         previous_schema.connection.execute("DROP TABLE IF EXISTS descriptions")
         return SchemaV1.create(previous_schema.connection)
 
-    def add(self, cve: CVE, source_feed: int, **extra_cols):
-        if "configurations" not in extra_cols:
-            extra_cols["configurations"] = cve.configurations.dumps()
-        super().add(cve, source_feed, **extra_cols)
-        for ref in cve.references:
-            self.connection.execute(
-                "INSERT OR REPLACE INTO refs "
-                "(cve, name, url) "
-                "VALUES (?, ?, ?)", (
-                    cve.cve_id, ref.name, ref.url
-                )
-            )
+    INSERT_COLUMNS: Tuple[str, ...] = SchemaV0.INSERT_COLUMNS + ("configurations",)
+
+    def cve_values(self, cve: CVE, source_feed: int) -> List[Optional[Union[float, int, str]]]:
+        values = super().cve_values(cve, source_feed)
+        values.append(cve.configurations.dumps())
+        return values
+
+    def add_many(self, cves: Sequence[CVE], source_feed: int):
+        super().add_many(cves, source_feed)
+        cve_ids = self._unique_ids(cves)
+        self.connection.execute(f"DELETE FROM refs WHERE {in_list('cve', len(cve_ids))}", cve_ids)
+        self.connection.executemany(
+            "INSERT INTO refs "
+            "(cve, name, url) "
+            "VALUES (?, ?, ?)", [
+                (cve.cve_id, ref.name, ref.url) for cve in self._last_occurrences(cves) for ref in cve.references
+            ]
+        )
+        for cve in cves:
+            self._add_cpes(cve)
+
+    def _add_cpes(self, cve: CVE):
         c = self.connection.cursor()
         cols = ("part", "vendor", "product", "version", "update_str", "edition", "language", "sw_edition", "target_sw",
                 "other")
@@ -494,8 +736,9 @@ class SchemaV1(SchemaV0):
                 query.remove_from_parent()
         super().finalize_query(select)
         if cpe_queries:
-            select.from_tables = "(((descriptions d INNER JOIN cves c ON d.cve = c.id) " \
-                                 "INNER JOIN configurations f ON f.cve = c.id) "\
+            # a CVE can have more than one matching CPE
+            select.columns = f"DISTINCT {select.columns}"
+            select.from_tables = "((cves c INNER JOIN configurations f ON f.cve = c.id) " \
                                  "INNER JOIN cpes p ON p.rowid == f.cpe)"
             if select.where is None:
                 select.where = TRUE
@@ -515,25 +758,25 @@ class SchemaV1(SchemaV0):
             extra_row_handler: Callable[[Tuple[Union[float, int, str], ...], Dict[str, Any]], Any] = lambda *_: None
     ) -> Iterator[CVE]:
         def handle_configurations(extra_rows: Tuple[Union[float, int, str], ...], kwargs: Dict[str, Any]):
-            _, _, configurations, *extra_rows = extra_rows
+            configurations, *extra_rows = extra_rows
             kwargs["configurations"] = Configurations.loads(configurations)
             if extra_rows:
                 extra_row_handler(extra_rows, kwargs)
 
-        for cve in super().cve_iter(rows, extra_row_handler=handle_configurations):
-            d = self.connection.cursor()
-            d.execute(f"SELECT url, name FROM refs WHERE cve = ?", (cve.cve_id,))
-            references = tuple(Reference(url, name) for url, name in d.fetchall())
-            if references:
-                yield CVE(
-                    cve_id=cve.cve_id,
-                    published_date=cve.published_date,
-                    last_modified_date=cve.last_modified_date,
-                    impact=cve.impact,
-                    descriptions=cve.descriptions,
-                    references=references,
-                    assigner=cve.assigner,
-                    configurations=cve.configurations
-                )
-            else:
-                yield cve
+        for batch in batched(super().cve_iter(rows, extra_row_handler=handle_configurations), LOOKUP_BATCH_SIZE):
+            references_by_cve = self.lookup_by_cve("SELECT cve, url, name FROM refs", [cve.cve_id for cve in batch])
+            for cve in batch:
+                references = tuple(Reference(url, name) for _, url, name in references_by_cve.get(cve.cve_id, ()))
+                if references:
+                    yield CVE(
+                        cve_id=cve.cve_id,
+                        published_date=cve.published_date,
+                        last_modified_date=cve.last_modified_date,
+                        impact=cve.impact,
+                        descriptions=cve.descriptions,
+                        references=references,
+                        assigner=cve.assigner,
+                        configurations=cve.configurations
+                    )
+                else:
+                    yield cve
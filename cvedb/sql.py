@@ -1,6 +1,44 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
-from typing import Iterable, Iterator, List, Optional, Union
+from sqlite3 import Cursor
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
+
+
+T = TypeVar("T")
+
+
+# the number of rows to pull from a cursor at a time in `fetch_rows`
+FETCH_BATCH_SIZE: int = 512
+
+
+def fetch_rows(cursor: Cursor, batch_size: int = FETCH_BATCH_SIZE) -> Iterator[Tuple[Any, ...]]:
+    """Lazily yields the result rows of `cursor`, fetching them from SQLite `batch_size` rows at a time"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+
+def batched(items: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    """Lazily yields lists of up to `batch_size` consecutive elements of `items`"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            break
+        yield batch
+
+
+@lru_cache(maxsize=None)
+def in_list(column: str, num_values: int) -> str:
+    """Returns a condition testing whether `column` equals one of `num_values` parameters that are to be bound"""
+    if num_values == 1:
+        # the common case of a single feed
+        return f"{column} = ?"
+    return f"{column} IN ({', '.join('?' * num_values)})"
 
 
 class Query(ABC):
@@ -29,7 +29,9 @@ setup(
         "cvedb": ["data/*.json.gz", "data/*.meta"]
     },
     extras_require={
-        "dev": ["flake8", "pytest", "rstr~=2.2.6", "twine"]
+        "dev": ["flake8", "pytest", "rstr~=2.2.6", "twine"],
+        # optional dependencies that speed up downloading the CVE feeds
+        "fast": ["orjson;python_version>='3.8'"]
     },
     entry_points={
         "console_scripts": [
@@ -1,11 +1,13 @@
+import pickle
 from random import choice, randint
-from typing import Callable, TypeVar, Union
+from typing import Callable, Optional, TypeVar, Union
 from unittest import TestCase
 
 from rstr import xeger
 
 from cvedb.cpe import (
-    AV_STRING_REGEX, CPE, FormattedStringParser, LANGTAG_REGEX, Language, Logical, parse_formatted_string, Part
+    AV_STRING_REGEX, CPE, FormattedStringError, FormattedStringParser, LANGTAG_REGEX, Language, Logical,
+    Or, parse_formatted_string, Part, version_key, VersionRange
 )
 
 
@@ -76,6 +78,92 @@ class TestCPE(TestCase):
             cpe = random_cpe()
             self.assertEqual(cpe, CPE.loads(cpe.dumps()))
 
+    def test_pickling(self):
+        cpes = [random_cpe() for _ in range(20)]
+        cpes.append(CPE(lang=Language("en", "us")))
+        cpes.append(CPE(lang=Language("es", 419)))
+        or_test = Or(cpes)
+        hash(or_test)
+        for cpe in cpes:
+            str(cpe)
+        # string hashes differ between processes, so cached hashes must not be pickled
+        loaded = pickle.loads(pickle.dumps(or_test))
+        self.assertEqual(loaded, or_test)
+        self.assertIsNone(loaded._hash)
+        for cpe, loaded_cpe in zip(cpes, loaded.children):
+            self.assertNotIn("_hash", loaded_cpe.__dict__)
+            self.assertNotIn("_formatted_string", loaded_cpe.__dict__)
+            if isinstance(cpe.lang, Language):
+                self.assertIsNone(loaded_cpe.lang._hash)
+            self.assertEqual(hash(loaded_cpe), hash(cpe))
+            self.assertEqual(str(loaded_cpe), str(cpe))
+
+    def test_unescaped_parsing(self):
+        for i in range(100):
+            fs = random_cpe().formatted_string()
+            self.assertEqual(parse_formatted_string(fs), FormattedStringParser(fs).parse())
+        with self.assertRaises(FormattedStringError):
+            parse_formatted_string("cpe:2.3:a:ven*dor:product:1.0:*:*:*:*:*:*:*")
+
+    def test_pathological_parsing(self):
+        # The attribute-value string grammar is unambiguous, so malformed strings should be rejected in linear time
+        # rather than sending the regex engine into catastrophic backtracking. Wall-clock limits are unreliable on busy
+        # machines, so only the result is checked; the strings are long enough that backtracking would make this test
+        # conspicuously slow.
+        for vendor in ("?" * 50000 + "!", "a" * 50000 + "!", "a?" * 25000, "\\:" * 25000 + "!"):
+            fs = f"cpe:2.3:a:{vendor}:product:*:*:*:*:*:*:*:*"
+            with self.assertRaises(FormattedStringError):
+                parse_formatted_string(fs)
+
+    def test_parse_repeated(self):
+        def parse(at_least: int = 0, at_most: Optional[int] = None):
+            parser = FormattedStringParser("ababc")
+
+            def ab() -> str:
+                parser.expect("ab")
+                return "ab"
+
+            return parser.parse_repeated(ab, at_least=at_least, at_most=at_most), parser.offset
+
+        # as many repetitions as possible are parsed, up to `at_most`
+        self.assertEqual(parse(), (["ab", "ab"], 4))
+        self.assertEqual(parse(at_least=1), (["ab", "ab"], 4))
+        self.assertEqual(parse(at_least=2, at_most=2), (["ab", "ab"], 4))
+        self.assertEqual(parse(at_most=1), (["ab"], 2))
+        self.assertEqual(parse(at_most=0), ([], 0))
+        self.assertEqual(parse(at_least=2, at_most=1), ([], 0))
+        # it is an error for there to be fewer than `at_least`
+        with self.assertRaises(FormattedStringError):
+            parse(at_least=3)
+
+    def test_version_range(self):
+        version_range = VersionRange(CPE(vendor="foo"), start="2.0", end="10.0", include_end=False)
+        self.assertFalse(version_range.match(CPE(vendor="foo", version="1.9")))
+        self.assertTrue(version_range.match(CPE(vendor="foo", version="2.0")))
+        self.assertTrue(version_range.match(CPE(vendor="foo", version="9.5")))
+        self.assertFalse(version_range.match(CPE(vendor="foo", version="10.0")))
+        self.assertFalse(version_range.match(CPE(vendor="foo", version="11")))
+        self.assertFalse(version_range.match(CPE(vendor="bar", version="9.5")))
+
+    def test_version_key(self):
+        versions = [
+            "1.0.dev1", "1.0a1", "1.0a2", "1.0b1", "1.0-beta2", "1.0rc1", "1.0", "1.0.1", "1.0.1a", "1.0.2", "1.1", "9",
+            "10"
+        ]
+        self.assertEqual(sorted(reversed(versions), key=version_key), versions)
+        version_range = VersionRange(CPE(vendor="foo"), start="2.0", end="3.0", include_end=False)
+        self.assertFalse(version_range.match(CPE(vendor="foo", version="2.0rc1")))
+        self.assertTrue(version_range.match(CPE(vendor="foo", version="3.0-rc1")))
+
+    def test_or(self):
+        children = [CPE(vendor=choice(("foo", "bar", "baz")), product=random_avstring()) for _ in range(20)]
+        children.append(VersionRange(CPE(vendor="foo"), start="2.0"))
+        children.append(CPE(product=children[0].product))
+        or_test = Or(children)
+        for cpe in children[:-2] + [CPE(vendor="foo", version="1.0"), CPE(vendor="qux", product=children[0].product),
+                                    CPE(vendor="qux"), CPE(product=children[1].product)]:
+            self.assertEqual(or_test.match(cpe), any(child.match(cpe) for child in children))
+
     def test_wildcards(self):
         self.assertTrue(CPE().is_complete_wildcard())
         self.assertFalse(CPE(vendor="foo").is_complete_wildcard())
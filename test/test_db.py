@@ -0,0 +1,184 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+from typing import Iterable, Optional
+from unittest import TestCase
+from unittest.mock import patch
+
+from cvss import CVSS2, CVSS3
+
+from cvedb.cve import Configurations, CVE, Description, Reference, Severity
+from cvedb.db import CVEdb
+from cvedb.feed import Data, DataSource, Feed, InMemoryData
+from cvedb.search import AfterModifiedDateQuery, AndQuery, BeforePublishedDateQuery, Sort, TermQuery
+
+
+LAST_MODIFIED = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+
+class StaticFeed(Feed):
+    register = False
+
+    def __init__(self, name: str, cves: Iterable[CVE]):
+        super().__init__(name)
+        self.cves = tuple(cves)
+
+    def reload(self, existing_data: Optional[Data] = None) -> DataSource:
+        return InMemoryData(LAST_MODIFIED, self.cves)
+
+
+CVES = (
+    CVE(
+        cve_id="CVE-2020-0001",
+        published_date=datetime(2020, 1, 1, tzinfo=timezone.utc),
+        last_modified_date=datetime(2020, 6, 1, tzinfo=timezone.utc),
+        impact=CVSS3("CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H"),
+        descriptions=(Description("en", "A buffer overflow in the frobnicator"),),
+        references=(Reference(url="https://example.com/0001", name="advisory"),)
+    ),
+    CVE(
+        cve_id="CVE-2020-0002",
+        published_date=datetime(2020, 2, 1, tzinfo=timezone.utc),
+        last_modified_date=datetime(2020, 3, 1, tzinfo=timezone.utc),
+        impact=CVSS2("AV:N/AC:L/Au:N/C:P/I:P/A:P"),
+        descriptions=(Description("en", "Cross-site scripting in the widget"),)
+    ),
+    CVE(
+        cve_id="CVE-2020-0003",
+        published_date=datetime(2020, 3, 1, tzinfo=timezone.utc),
+        last_modified_date=datetime(2020, 4, 1, tzinfo=timezone.utc),
+        descriptions=(Description("en", "Heap Overflow in the widget"),)
+    ),
+)
+
+
+class TestDb(TestCase):
+    def setUp(self):
+        self._tmpdir = TemporaryDirectory()
+        self.db_path = Path(self._tmpdir.name) / "cvedb.sqlite"
+        self.feed = StaticFeed("static", CVES)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_iteration(self):
+        with CVEdb.open(self.db_path, parents=[self.feed]) as db:
+            data = db.data()
+            self.assertEqual(len(data), len(CVES))
+            cves = {cve.cve_id: cve for cve in data}
+        self.assertEqual(set(cves), {cve.cve_id for cve in CVES})
+        for expected in CVES:
+            cve = cves[expected.cve_id]
+            self.assertEqual(cve.published_date, expected.published_date)
+            self.assertEqual(cve.last_modified_date, expected.last_modified_date)
+            self.assertEqual(cve.descriptions, expected.descriptions)
+            self.assertEqual(cve.references, expected.references)
+            self.assertEqual(cve.severity, expected.severity)
+
+    def test_search(self):
+        with CVEdb.open(self.db_path, parents=[self.feed]) as db:
+            self.assertEqual(
+                [cve.cve_id for cve in db.data().search("overflow")], ["CVE-2020-0001", "CVE-2020-0003"]
+            )
+            self.assertEqual(
+                [cve.cve_id for cve in db.data().search("widget", sort=(Sort.PUBLISHED_DATE,), ascending=False)],
+                ["CVE-2020-0003", "CVE-2020-0002"]
+            )
+            self.assertEqual([cve.cve_id for cve in db.data().search("frobnicator", "scripting")],
+                             ["CVE-2020-0001", "CVE-2020-0002"])
+            self.assertEqual(list(db.data().search("nonexistent")), [])
+            self.assertEqual([cve.cve_id for cve in db.data().search(AndQuery(TermQuery("overflow")))],
+                             ["CVE-2020-0001", "CVE-2020-0003"])
+
+    def test_date_search(self):
+        with CVEdb.open(self.db_path, parents=[self.feed]) as db:
+            self.assertEqual(
+                [cve.cve_id for cve in db.data().search(
+                    AndQuery(BeforePublishedDateQuery(datetime(2020, 2, 1, tzinfo=timezone.utc)), TermQuery("the"))
+                )],
+                ["CVE-2020-0001", "CVE-2020-0002"]
+            )
+            self.assertEqual(
+                [cve.cve_id for cve in db.data().search(
+                    AndQuery(AfterModifiedDateQuery(datetime(2020, 3, 15, tzinfo=timezone.utc)), TermQuery("the"))
+                )],
+                ["CVE-2020-0001", "CVE-2020-0003"]
+            )
+
+    def test_shutdown(self):
+        with CVEdb.open(self.db_path, parents=[self.feed]) as db:
+            self.assertEqual(len(db.data()), len(CVES))
+        CVEdb.shutdown()
+        with CVEdb.open(self.db_path, parents=[self.feed]) as db:
+            self.assertEqual(len(db.data()), len(CVES))
+            # connections that are in use are left open
+            CVEdb.shutdown()
+            self.assertEqual(len(db.data()), len(CVES))
+
+        def use_db():
+            with CVEdb.open(self.db_path, parents=[self.feed]) as thread_db:
+                self.assertEqual(len(thread_db.data()), len(CVES))
+
+        # connections opened by other threads cannot be closed from this one, so they are skipped
+        thread = Thread(target=use_db)
+        thread.start()
+        thread.join()
+        CVEdb.shutdown()
+
+    def test_nested_contexts(self):
+        # nested contexts share a connection, so the inner one must leave committing or rolling back to the outer one
+        with self.assertRaises(KeyError):
+            with CVEdb.open(self.db_path, parents=[self.feed]):
+                with CVEdb.open(self.db_path, parents=[self.feed]) as inner:
+                    inner.connection.execute("INSERT INTO feeds (name) VALUES ('nested')")
+                raise KeyError("nested")
+        with CVEdb.open(self.db_path, parents=[self.feed]) as db:
+            self.assertEqual(db.connection.execute("SELECT COUNT(*) FROM feeds WHERE name = 'nested'").fetchone(), (0,))
+            self.assertEqual(len(db.data()), len(CVES))
+
+    def test_unindexed_descriptions(self):
+        with CVEdb.open(self.db_path, parents=[self.feed]) as db:
+            self.assertEqual(len(db.data()), len(CVES))
+            feed_id = db.feeds[0].feed_id
+        # simulate a SQLite without FTS5, which must drop the triggers that maintain the full-text index in order to
+        # write to the descriptions table
+        with patch("cvedb.schemas.FTS_SUPPORTED", False):
+            with CVEdb.open(self.db_path, parents=[self.feed]) as db:
+                c = db.connection
+                self.assertEqual(c.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='trigger'").fetchone(), (0,))
+                c.execute(
+                    "INSERT INTO cves (id, feed, published, last_modified, severity, configurations) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    ("CVE-2020-0004", feed_id, 0, 0, int(Severity.UNKNOWN), Configurations(()).dumps())
+                )
+                c.execute(
+                    "INSERT INTO descriptions (cve, description) VALUES (?, ?)", ("CVE-2020-0004", "A zebrafish bug")
+                )
+        # the stale index is rebuilt once the database is opened with FTS5 support again
+        with CVEdb.open(self.db_path, parents=[self.feed]) as db:
+            self.assertEqual(len(db.data()), len(CVES) + 1)
+            self.assertEqual([cve.cve_id for cve in db.data().search("zebrafish")], ["CVE-2020-0004"])
+            self.assertEqual(
+                db.connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='trigger'").fetchone(), (3,)
+            )
+
+    def test_re_add(self):
+        with CVEdb.open(self.db_path, parents=[self.feed]) as db:
+            data = db.data()
+            feed = db.feeds[0]
+            # re-adding a CVE, as happens when a feed is updated, should replace its descriptions and references
+            feed.schema.add(CVES[0], feed.feed_id)
+            cves = {cve.cve_id: cve for cve in data}
+        self.assertEqual(len(cves), len(CVES))
+        self.assertEqual(cves[CVES[0].cve_id].descriptions, CVES[0].descriptions)
+        self.assertEqual(cves[CVES[0].cve_id].references, CVES[0].references)
+
+    def test_feed_ids(self):
+        with CVEdb.open(self.db_path, parents=[StaticFeed("first", CVES[:1])]) as db:
+            self.assertEqual(len(db.data()), 1)
+        # registering a new feed before an existing one must not change the existing feed's ID
+        with CVEdb.open(self.db_path, parents=[StaticFeed("second", CVES[1:]), StaticFeed("first", CVES[:1])]) as db:
+            second, first = db.feeds
+            self.assertNotEqual(first.feed_id, second.feed_id)
+            self.assertEqual([cve.cve_id for cve in first.data()], [CVES[0].cve_id])